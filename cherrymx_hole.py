@@ -3,7 +3,10 @@
 # Jog machine to desired location then run the output generated by this script.
 
 from gcode_base import *
+from gcode_cache import *
+from feeds_speeds import *
 from gcode_profile_polygon import *
+from gcode_trochoidal import *
 from math_base import *
 
 def cherrymx_points(
@@ -60,8 +63,23 @@ def cherrymx_profile(
                      endmill=3.0,
                      direction='ccw',
                      ablpd=True,
+                     entry='plunge',
+                     ramp_angle=radians(3.0),
+                     trochoid_radius=0.0,
+                     trochoid_stepover=0.1,
+                     corners='sharp',
+                     corner_tolerance=0.05,
+                     adaptive=False,
+                     min_pitch=0.0,
+                     finishing=0.0,
                     ): # {{{
     '''Generate gcode for a hole at the current position to hold cherry mx switches.
+Corners are cut sharp, rounded with fillets within corner_tolerance, or left
+  for the controller to blend with G64 P (LinuxCNC, not GRBL), which is
+  cancelled by a plain G64 at the end.
+If adaptive is True, fillets are fed for how much of the endmill is engaged,
+  so corners must be 'fillet' and trochoids aren't supported.
+min_pitch and finishing set the depth passes, see depth_passes().
     '''
 
     assert isinstance(width, float) and width > 0.0
@@ -76,8 +94,18 @@ def cherrymx_profile(
     assert isinstance(endmill, float) and endmill < width
     assert isinstance(direction, str) and direction in ['cw', 'ccw']
     assert isinstance(ablpd, bool)
+    assert isinstance(entry, str) and entry in ['plunge', 'ramp', 'helix']
+    # Trochoidal loops widen the cut, so points are generated for a virtual
+    #   endmill which is wider by the loop diameter.
+    assert isinstance(trochoid_radius, float) and trochoid_radius >= 0.0
+    assert isinstance(trochoid_stepover, float) and trochoid_stepover > 0.0
+    assert isinstance(corners, str) and corners in ['sharp', 'fillet', 'g64']
+    assert isinstance(corner_tolerance, float) and corner_tolerance > 0.0
+    assert isinstance(adaptive, bool) and \
+           (corners == 'fillet' and trochoid_radius == 0.0 or not adaptive)
     
-    pts = cherrymx_points(width, notch_depth, notch_height, rotate, endmill)
+    pts = cherrymx_points(width, notch_depth, notch_height, rotate,
+                          endmill + 2*trochoid_radius)
     
     # Initialise gcode lines.
     g = []
@@ -89,24 +117,59 @@ def cherrymx_profile(
     # Required to make this code callable like a function.
     g.append('G91')
     
-    g.append(polygon_profile(
-                             pts=pts,
-                             depth=depth,
-                             pitch=pitch,
-                             feedrate=feedrate,
-                             plungerate=plungerate,
-                             clearance=clearance,
-                             ablpd=ablpd,
-                            ))
+    # Let the controller cut corners short instead of stopping at them.
+    # This blends corners into the material too, which fillets avoid.
+    if corners == 'g64':
+        g.append('G64 P%s' % floatf(corner_tolerance))
+    
+    if trochoid_radius > 0.0:
+        g.append(trochoidal_profile(
+                                    pts=pts,
+                                    radius=trochoid_radius,
+                                    stepover=trochoid_stepover,
+                                    depth=depth,
+                                    pitch=pitch,
+                                    feedrate=feedrate,
+                                    clearance=clearance,
+                                    direction=direction,
+                                    min_pitch=min_pitch,
+                                    finishing=finishing,
+                                   ))
+    else:
+        g.append(polygon_profile(
+                                 pts=pts,
+                                 depth=depth,
+                                 pitch=pitch,
+                                 feedrate=feedrate,
+                                 plungerate=plungerate,
+                                 clearance=clearance,
+                                 ablpd=ablpd,
+                                 entry=entry,
+                                 ramp_angle=ramp_angle,
+                                 fillet=corner_tolerance if corners == 'fillet' else 0.0,
+                                 endmill=endmill,
+                                 adaptive=adaptive,
+                                 min_pitch=min_pitch,
+                                 finishing=finishing,
+                                ))
+    
+    # Back to plain G64 so the tolerance doesn't carry on into whatever is
+    #   cut after the hole.
+    if corners == 'g64':
+        g.append('G64')
     
     return '\n'.join(g)
 # }}}
 
 
-if __name__ == '__main__':
+def cherrymx_hole_gcode(argv=None): # {{{
+    '''Return gcode for command line arguments, from sys.argv if argv is None.
+Nothing is printed, so this can be called repeatedly by a long running
+  process such as gcode_server.py.
+    '''
     import argparse
     
-    parser = argparse.ArgumentParser()
+    parser = argparse.ArgumentParser(prog='cherrymx_hole.py')
     
     parser.add_argument('--width',
                         action='store',
@@ -144,6 +207,18 @@ if __name__ == '__main__':
                         type=float,
                         help='cutting pitch')
     
+    parser.add_argument('--min_pitch',
+                        action='store',
+                        default=0.0,
+                        type=float,
+                        help='shallowest pass allowed when balancing passes, 0 for no limit (mm)')
+    
+    parser.add_argument('--finishing',
+                        action='store',
+                        default=0.0,
+                        type=float,
+                        help='depth of a separate last pass, 0 for none (mm)')
+    
     parser.add_argument('--feedrate',
                         action='store',
                         default=500.0,
@@ -179,9 +254,84 @@ if __name__ == '__main__':
                         default=1,
                         type=int,
                         choices=[0, 1],
-                        help='Anti Backlash Point Drilling')
+                        help='Anti Backlash Point Drilling, or use 0 and gcode_backlash.py')
+    
+    parser.add_argument('--entry',
+                        action='store',
+                        default='plunge',
+                        choices=['plunge', 'ramp', 'helix'],
+                        help='how each pass enters the material')
+    
+    parser.add_argument('--ramp_angle',
+                        action='store',
+                        default=radians(3.0),
+                        type=float,
+                        help='ramp or helix angle from horizontal (radians)')
+    
+    parser.add_argument('--trochoid_radius',
+                        action='store',
+                        default=0.0,
+                        type=float,
+                        help='trochoidal loop radius, 0 to disable (mm)')
+    
+    parser.add_argument('--trochoid_stepover',
+                        action='store',
+                        default=0.1,
+                        type=float,
+                        help='advance per trochoidal loop (mm)')
+    
+    parser.add_argument('--corners',
+                        action='store',
+                        default='sharp',
+                        choices=['sharp', 'fillet', 'g64'],
+                        help='cut corners sharp, round them with fillets, or blend with G64 P (LinuxCNC only, GRBL rejects G64)')
+    
+    parser.add_argument('--corner_tolerance',
+                        action='store',
+                        default=0.05,
+                        type=float,
+                        help='furthest a rounded corner may be from the sharp one (mm)')
+    
+    parser.add_argument('--adaptive',
+                        action='store',
+                        default=0,
+                        type=int,
+                        choices=[0, 1],
+                        help='set feedrate of fillets for how much of the endmill is engaged, needs --corners fillet and no trochoids')
+    
+    parser.add_argument('--cache',
+                        action='store',
+                        default='',
+                        help='directory to cache generated programs in, or empty to disable')
+    
+    parser.add_argument('--tool',
+                        action='store',
+                        default='',
+                        choices=[''] + sorted(tool_library.keys()),
+                        help='endmill from the tool library, overrides --endmill')
+    
+    parser.add_argument('--material',
+                        action='store',
+                        default='',
+                        choices=[''] + sorted(material_library.keys()),
+                        help='calculate feeds for this material, overrides --feedrate, --plungerate and --pitch')
+    
+    parser.add_argument('--rpm',
+                        action='store',
+                        default=10000.0,
+                        type=float,
+                        help='spindle speed used to calculate feeds (rpm)')
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    
+    # A material sets the feeds, for a tool from the library or a 2 flute
+    #   endmill of the given diameter.
+    if len(args.tool):
+        args.endmill = tool_library[args.tool]['diameter']
+    if len(args.material):
+        tool = args.tool if len(args.tool) else tool_spec(args.endmill)
+        fs = feeds_speeds(tool, args.material, args.rpm)
+        (args.feedrate, args.plungerate, args.pitch) = (fs['feedrate'], fs['plungerate'], fs['pitch'])
     
     # Initialise gcode lines.
     g = []
@@ -196,21 +346,37 @@ if __name__ == '__main__':
     g.append('G91 G0 Z%s' % floatf(args.clearance))
     
     # Cherry profile function should assume spindle at clearance.
-    g.append(cherrymx_profile(
-                              width=args.width,
-                              depth=args.depth,
-                              notch_depth=args.notch_depth,
-                              notch_height=args.notch_height,
-                              rotate=args.rotate,
-                              pitch=args.pitch,
-                              feedrate=args.feedrate,
-                              plungerate=args.plungerate,
-                              clearance=args.clearance,
-                              endmill=args.endmill,
-                              direction=args.direction,
-                              ablpd=bool(args.ablpd),
-                             ))
+    g.append(cached_call(
+                         cherrymx_profile,
+                         cache_dir=args.cache,
+                         width=args.width,
+                         depth=args.depth,
+                         notch_depth=args.notch_depth,
+                         notch_height=args.notch_height,
+                         rotate=args.rotate,
+                         pitch=args.pitch,
+                         feedrate=args.feedrate,
+                         plungerate=args.plungerate,
+                         clearance=args.clearance,
+                         endmill=args.endmill,
+                         direction=args.direction,
+                         ablpd=bool(args.ablpd),
+                         entry=args.entry,
+                         ramp_angle=args.ramp_angle,
+                         trochoid_radius=args.trochoid_radius,
+                         trochoid_stepover=args.trochoid_stepover,
+                         corners=args.corners,
+                         corner_tolerance=args.corner_tolerance,
+                         adaptive=bool(args.adaptive),
+                         min_pitch=args.min_pitch,
+                         finishing=args.finishing,
+                        ))
     # Cherry profile function should leave spindle at clearance.
 
+    return '\n'.join(g)
+# }}}
+
+
+if __name__ == '__main__':
     # Put gcode onto STDOUT to let caller do any file redirect.
-    print('\n'.join(g))
+    print(cherrymx_hole_gcode())
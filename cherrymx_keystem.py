@@ -3,7 +3,10 @@
 # Jog machine to desired location then run the output generated by this script.
 
 from gcode_base import *
+from gcode_cache import *
 from gcode_profile_polygon import *
+from gcode_trochoidal import *
+from patterns import *
 from math_base import *
 
 def cherrymx_keycross_points(
@@ -76,7 +79,7 @@ def cherrymx_keysup_points(
     return pts
 # }}}
 
-def array_keystem_points(
+def array_keystem_pattern(
                     height=6,
                     width=14,
                     supheight=5.2,
@@ -84,7 +87,7 @@ def array_keystem_points(
                     space=1.0,
                     endmill=1.0,
                    ): # {{{
-    '''Generate points for polygon used for making CherryMX cross support for keycaps.
+    '''Return pattern of positions for an array of CherryMX keystems.
     '''
     
     # Calculate points to move to.
@@ -92,16 +95,25 @@ def array_keystem_points(
     ydiff = supheight + endmill + space + endmill
     
     # Move along X row, then up Y column to next row, then back along row.
-    pts = []
-    yacc = 0.0
-    for row in range(height):
-        r = [(col*xdiff, yacc) for col in range(width)]
-        if not row % 2:
-            r.reverse()
-        yacc += ydiff
-        pts += r
+    # First row runs right to left.
+    return pattern_grid(((width-1)*xdiff, 0.0), (-xdiff, ydiff), width, height,
+                        serpentine=True)
+# }}}
+
+def array_keystem_points(
+                    height=6,
+                    width=14,
+                    supheight=5.2,
+                    supwidth=6.8,
+                    space=1.0,
+                    endmill=1.0,
+                   ): # {{{
+    '''Generate points for polygon used for making CherryMX cross support for keycaps.
+    '''
     
-    return pts
+    p = array_keystem_pattern(height, width, supheight, supwidth, space, endmill)
+    
+    return [(x, y) for (x, y, r) in expand_pattern(p)]
 # }}}
 
 def cherrymx_keystem_profile(
@@ -119,6 +131,10 @@ def cherrymx_keystem_profile(
                      endmill=1.0,
                      direction='ccw',
                      ablpd=True,
+                     entry='plunge',
+                     ramp_angle=radians(3.0),
+                     trochoid_radius=0.0,
+                     trochoid_stepover=0.1,
                     ): # {{{
     '''Generate gcode for a hole at the current position to hold cherry mx keystem.
     '''
@@ -135,12 +151,22 @@ def cherrymx_keystem_profile(
     assert isinstance(endmill, float) and endmill < crosswidth
     assert isinstance(direction, str) and direction in ['cw', 'ccw']
     assert isinstance(ablpd, bool)
+    assert isinstance(entry, str) and entry in ['plunge', 'ramp', 'helix']
+    # Trochoidal loops widen the cut, so points are generated for a virtual
+    #   endmill which is wider by the loop diameter.
+    assert isinstance(trochoid_radius, float) and trochoid_radius >= 0.0
+    assert isinstance(trochoid_stepover, float) and trochoid_stepover > 0.0
+    # Each spar of the cross is a slot the (virtual) endmill has to fit in,
+    #   or the offset points cross over and the walls are overcut.
+    assert crossheight_thk >= endmill + 2*trochoid_radius and \
+           crosswidth_thk >= endmill + 2*trochoid_radius, \
+        'Cross spars are narrower than endmill + 2*trochoid_radius.'
     
     pts = cherrymx_keycross_points(crossheight,
                                    crosswidth,
                                    crossheight_thk,
                                    crosswidth_thk,
-                                   endmill)
+                                   endmill + 2*trochoid_radius)
     
     # Initialise gcode lines.
     g = []
@@ -149,36 +175,70 @@ def cherrymx_keystem_profile(
     # Required to make this code callable like a function.
     g.append('G91')
     
-    g.append(polygon_profile(
-                             pts=pts,
-                             depth=depth,
-                             pitch=pitch,
-                             feedrate=feedrate,
-                             plungerate=plungerate,
-                             clearance=clearance,
-                             ablpd=ablpd,
-                            ))
-    
-    # Now the surrounding support square.
-    pts = cherrymx_keysup_points(supheight, supwidth, endmill)
-    g.append(polygon_profile(
-                             pts=pts,
-                             depth=depth,
-                             pitch=pitch,
-                             feedrate=feedrate,
-                             plungerate=plungerate,
-                             clearance=clearance,
-                             ablpd=ablpd,
-                            ))
+    if trochoid_radius > 0.0:
+        g.append(trochoidal_profile(
+                                    pts=pts,
+                                    radius=trochoid_radius,
+                                    stepover=trochoid_stepover,
+                                    depth=depth,
+                                    pitch=pitch,
+                                    feedrate=feedrate,
+                                    clearance=clearance,
+                                    direction=direction,
+                                   ))
+    else:
+        g.append(polygon_profile(
+                                 pts=pts,
+                                 depth=depth,
+                                 pitch=pitch,
+                                 feedrate=feedrate,
+                                 plungerate=plungerate,
+                                 clearance=clearance,
+                                 ablpd=ablpd,
+                                 entry=entry,
+                                 ramp_angle=ramp_angle,
+                                ))
+    
+    # Now the surrounding support square, cut from outside.
+    pts = cherrymx_keysup_points(supheight, supwidth,
+                                 endmill + 2*trochoid_radius)
+    if trochoid_radius > 0.0:
+        g.append(trochoidal_profile(
+                                    pts=pts,
+                                    radius=trochoid_radius,
+                                    stepover=trochoid_stepover,
+                                    depth=depth,
+                                    pitch=pitch,
+                                    feedrate=feedrate,
+                                    clearance=clearance,
+                                    direction=direction,
+                                   ))
+    else:
+        g.append(polygon_profile(
+                                 pts=pts,
+                                 depth=depth,
+                                 pitch=pitch,
+                                 feedrate=feedrate,
+                                 plungerate=plungerate,
+                                 clearance=clearance,
+                                 ablpd=ablpd,
+                                 entry=entry,
+                                 ramp_angle=ramp_angle,
+                                 inside=False,
+                                ))
     
     return '\n'.join(g)
 # }}}
 
 
-if __name__ == '__main__':
+def cherrymx_keystem_gcode(argv=None): # {{{
+    '''Return gcode for command line arguments, from sys.argv if argv is None.
+Nothing is printed, so this can be called repeatedly by a long running
+  process such as gcode_server.py.
+    '''
     import argparse
     
-    parser = argparse.ArgumentParser()
+    parser = argparse.ArgumentParser(prog='cherrymx_keystem.py')
     
     parser.add_argument('--arrayheight',
                         action='store',
@@ -281,9 +341,38 @@ if __name__ == '__main__':
                         default=0,
                         type=int,
                         choices=[0, 1],
-                        help='Anti Backlash Point Drilling')
+                        help='Anti Backlash Point Drilling, or use 0 and gcode_backlash.py')
+    
+    parser.add_argument('--entry',
+                        action='store',
+                        default='plunge',
+                        choices=['plunge', 'ramp', 'helix'],
+                        help='how each pass enters the material')
+    
+    parser.add_argument('--ramp_angle',
+                        action='store',
+                        default=radians(3.0),
+                        type=float,
+                        help='ramp or helix angle from horizontal (radians)')
+    
+    parser.add_argument('--trochoid_radius',
+                        action='store',
+                        default=0.0,
+                        type=float,
+                        help='trochoidal loop radius, 0 to disable, cross spars must be at least endmill + twice this thick (mm)')
+    
+    parser.add_argument('--trochoid_stepover',
+                        action='store',
+                        default=0.1,
+                        type=float,
+                        help='advance per trochoidal loop (mm)')
+    
+    parser.add_argument('--cache',
+                        action='store',
+                        default='',
+                        help='directory to cache generated programs in, or empty to disable')
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
     
     # Initialise gcode lines.
     g = []
@@ -297,36 +386,45 @@ if __name__ == '__main__':
     # Assume spindle starts at zero.
     g.append('G0 Z%s' % floatf(args.clearance))
     
-    array_pts = array_keystem_points(
-                                     height=args.arrayheight,
-                                     width=args.arraywidth,
-                                     supheight=args.supheight,
-                                     supwidth=args.supwidth,
-                                     space=args.arrayspace,
-                                     endmill=args.endmill,
-                                    )
-    for pt in array_pts:
-        g.append('G0 X%s Y%s' % (floatf(pt[0]), floatf(pt[1])))
-        # Cherry profile function should assume spindle at clearance.
-        g.append(cherrymx_keystem_profile(
-                                          crossheight=args.crossheight,
-                                          crosswidth=args.crosswidth,
-                                          crossheight_thk=args.crossheight_thk,
-                                          crosswidth_thk=args.crosswidth_thk,
-                                          supheight=args.supheight,
-                                          supwidth=args.supwidth,
-                                          depth=args.depth,
-                                          pitch=args.pitch,
-                                          feedrate=args.feedrate,
-                                          plungerate=args.plungerate,
-                                          clearance=args.clearance,
-                                          endmill=args.endmill,
-                                          direction=args.direction,
-                                          ablpd=bool(args.ablpd),
-                                         ))
+    array = array_keystem_pattern(
+                                  height=args.arrayheight,
+                                  width=args.arraywidth,
+                                  supheight=args.supheight,
+                                  supwidth=args.supwidth,
+                                  space=args.arrayspace,
+                                  endmill=args.endmill,
+                                 )
+    # Every keystem is identical so the profile is only generated once.
+    # Cherry profile function should assume spindle at clearance.
     # Cherry profile function should leave spindle at clearance.
-        g.append('G90')
+    program = lambda rotate: cached_call(
+                                         cherrymx_keystem_profile,
+                                         cache_dir=args.cache,
+                                         crossheight=args.crossheight,
+                                         crosswidth=args.crosswidth,
+                                         crossheight_thk=args.crossheight_thk,
+                                         crosswidth_thk=args.crosswidth_thk,
+                                         supheight=args.supheight,
+                                         supwidth=args.supwidth,
+                                         depth=args.depth,
+                                         pitch=args.pitch,
+                                         feedrate=args.feedrate,
+                                         plungerate=args.plungerate,
+                                         clearance=args.clearance,
+                                         endmill=args.endmill,
+                                         direction=args.direction,
+                                         ablpd=bool(args.ablpd),
+                                         entry=args.entry,
+                                         ramp_angle=args.ramp_angle,
+                                         trochoid_radius=args.trochoid_radius,
+                                         trochoid_stepover=args.trochoid_stepover,
+                                        )
+    g += pattern_gcode(array, program, args.clearance)
 
+    return '\n'.join(g)
+# }}}
 
+
+if __name__ == '__main__':
     # Put gcode onto STDOUT to let caller do any file redirect.
-    print('\n'.join(g))
+    print(cherrymx_keystem_gcode())
@@ -0,0 +1,482 @@
+#!/usr/bin/env python
+# Read outlines from DXF and SVG drawings.
+# Entities are read one at a time from any iterable of lines, so large
+#   drawings don't have to be held in memory as text, then joined end to end
+#   into contours using a grid index of their endpoints.
+# Every entity and contour is a dict with:
+#   pts - list of (x, y) tuples, curves flattened to within tolerance.
+#   beziers - list of bezier control polygons, for curves which have them.
+#   closed - True if the last point joins back to the first.
+# Closed contours don't repeat the first point at the end, the same as the
+#   pts of cherrymx_points(), so can be passed straight to polygon_profile().
+
+import re
+
+from math_base import *
+from math_bezier import *
+
+
+def entity(pts=[], beziers=[], closed=False):
+    '''Return an entity dict.
+    '''
+    return {'pts': pts, 'beziers': beziers, 'closed': closed}
+
+
+def arc_pts(center=(0.0, 0.0), radius=1.0, start=0.0, sweep=2*pi,
+            tolerance=0.01):
+    '''Return points on an arc, with enough segments that no chord is more
+  than tolerance from the arc.
+Angles are in radians, positive sweep is CCW.
+    '''
+    assert isinstance(radius, float) and radius > 0.0
+    assert isinstance(tolerance, float) and tolerance > 0.0
+    
+    step = 2*acos(max(-1.0, 1.0 - tolerance/radius))
+    n = max(1, int(ceil(abs(sweep) / step)))
+    return [(center[0] + radius*cos(start + sweep*i/n),
+             center[1] + radius*sin(start + sweep*i/n)) for i in range(n+1)]
+
+
+def bulge_pts(a=(0.0, 0.0), b=(0.0, 0.0), bulge=0.0, tolerance=0.01):
+    '''Return points from a to b along a DXF polyline bulge arc.
+Bulge is the tangent of a quarter of the included angle, positive for CCW.
+    '''
+    if bulge == 0.0:
+        return [a, b]
+    
+    sweep = 4*atan(bulge)
+    chord = distance_between_pts(a, b)
+    if chord == 0.0:
+        return [a, b]
+    radius = chord / (2*sin(abs(sweep)/2))
+    
+    # Center is off the chord midpoint, to the left for CCW arcs.
+    h = radius * cos(sweep/2)
+    (dx, dy) = ((b[0] - a[0])/chord, (b[1] - a[1])/chord)
+    side = 1.0 if bulge > 0.0 else -1.0
+    center = ((a[0] + b[0])/2 - side*h*dy, (a[1] + b[1])/2 + side*h*dx)
+    start = atan2(a[1] - center[1], a[0] - center[0])
+    
+    pts = arc_pts(center, radius, start, sweep, tolerance)
+    return [a] + pts[1:-1] + [b]
+
+
+def bezier_pts(P=[], tolerance=0.01):
+    '''Return points on a bezier curve, with enough segments that no chord is
+  more than tolerance from the curve.
+The second derivative is bounded by the largest second difference of the
+  control points, which bounds the error of each chord.
+    '''
+    O = len(P) - 1
+    if O < 2:
+        return list(P)
+    
+    dd = max([2*distance_between_pts(P[i+1], pt_between_pts(P[i], P[i+2], 0.5))
+              for i in range(O - 1)])
+    n = max(1, int(ceil(sqrt(O*(O-1)*dd / (8*tolerance)))))
+    return pts_on_bezier_curve(P, n)
+
+
+def bspline_pts(degree=3, knots=[], ctrl=[], tolerance=0.01):
+    '''Return points on a B-spline, evaluated with de Boor's algorithm.
+Each knot span is split into segments as if it were a bezier curve over the
+  control points that affect it.
+    '''
+    n_ctrl = len(ctrl)
+    assert len(knots) == n_ctrl + degree + 1
+    
+    def de_boor(k, t):
+        d = [ctrl[j + k - degree] for j in range(degree + 1)]
+        for r in range(1, degree + 1):
+            for j in range(degree, r - 1, -1):
+                i = j + k - degree
+                span = knots[i + 1 + degree - r] - knots[i]
+                a = (t - knots[i]) / span if span > 0.0 else 0.0
+                d[j] = pt_between_pts(d[j-1], d[j], a)
+        return d[degree]
+    
+    pts = [ctrl[0]] if knots[degree] == knots[0] else []
+    for k in range(degree, n_ctrl):
+        (t0, t1) = (knots[k], knots[k+1])
+        if t1 <= t0:
+            continue
+        local = bezier_pts(ctrl[k-degree:k+1], tolerance)
+        n = max(1, len(local) - 1)
+        if not len(pts):
+            pts.append(de_boor(k, t0))
+        pts += [de_boor(k, t0 + (t1 - t0)*i/n) for i in range(1, n+1)]
+    
+    return pts
+
+
+def dxf_pairs(lines=[]):
+    '''Generate (code, value) pairs from the lines of a DXF file.
+    '''
+    it = iter(lines)
+    for code in it:
+        value = next(it, '')
+        yield (int(code), value.strip())
+
+
+def dxf_entity(kind='', data=[], tolerance=0.01):
+    '''Return entity for one DXF entity from its (code, value) pairs, or None
+  if it isn't an outline.
+    '''
+    first = {}
+    for (c, v) in data:
+        if c not in first:
+            first[c] = v
+    f = lambda c, d=0.0: float(first.get(c, d))
+    
+    if kind == 'LINE':
+        return entity([(f(10), f(20)), (f(11), f(21))])
+    
+    elif kind == 'CIRCLE':
+        pts = arc_pts((f(10), f(20)), f(40), 0.0, 2*pi, tolerance)
+        return entity(pts[:-1], [], True)
+    
+    elif kind == 'ARC':
+        start = radians(f(50))
+        sweep = (radians(f(51)) - start) % (2*pi)
+        return entity(arc_pts((f(10), f(20)), f(40), start, sweep or 2*pi,
+                              tolerance))
+    
+    elif kind == 'LWPOLYLINE':
+        # Bulges belong to the vertex before them.
+        verts = []
+        for (c, v) in data:
+            if c == 10:
+                verts.append([float(v), 0.0, 0.0])
+            elif c == 20:
+                verts[-1][1] = float(v)
+            elif c == 42 and len(verts):
+                verts[-1][2] = float(v)
+        closed = bool(int(f(70)) & 1)
+        pts = [(verts[0][0], verts[0][1])]
+        segs = len(verts) if closed else len(verts) - 1
+        for i in range(segs):
+            (a, b) = (verts[i], verts[(i+1) % len(verts)])
+            pts += bulge_pts((a[0], a[1]), (b[0], b[1]), a[2], tolerance)[1:]
+        if closed:
+            pts = pts[:-1]
+        return entity(pts, [], closed)
+    
+    elif kind == 'SPLINE':
+        knots = [float(v) for (c, v) in data if c == 40]
+        xs = [float(v) for (c, v) in data if c == 10]
+        ys = [float(v) for (c, v) in data if c == 20]
+        ctrl = list(zip(xs, ys))
+        degree = int(f(71, 3))
+        pts = bspline_pts(degree, knots, ctrl, tolerance)
+    
+        # Clamped splines with no interior knots are bezier curves.
+        beziers = [ctrl] if len(ctrl) == degree + 1 else []
+        return entity(pts, beziers, bool(int(f(70)) & 1))
+    
+    return None
+
+
+def dxf_entities(lines=[], tolerance=0.01):
+    '''Generate entities from the ENTITIES section of a DXF file.
+    '''
+    section = None
+    kind = None
+    data = []
+    for (c, v) in dxf_pairs(lines):
+        if c == 0:
+            if kind is not None:
+                e = dxf_entity(kind, data, tolerance)
+                if e is not None:
+                    yield e
+            (kind, data) = (None, [])
+            if v == 'SECTION':
+                section = ''
+            elif v == 'ENDSEC':
+                section = None
+            elif section == 'ENTITIES':
+                kind = v
+        elif c == 2 and section == '':
+            section = v
+        elif kind is not None:
+            data.append((c, v))
+
+
+# Path data is a series of commands, each followed by numbers.
+re_svg_path = re.compile(r'([MmLlHhVvCcSsQqTtAaZz])|([-+]?(?:[0-9]*\.[0-9]+|[0-9]+\.?)(?:[eE][-+]?[0-9]+)?)')
+
+
+def svg_arc_pts(a=(0.0, 0.0), b=(0.0, 0.0), rx=1.0, ry=1.0, phi=0.0,
+                large=False, sweep=False, tolerance=0.01):
+    '''Return points for an SVG elliptical arc from a to b, converting from
+  endpoint to center parameterisation as in the SVG specification.
+    '''
+    if rx == 0.0 or ry == 0.0 or a == b:
+        return [a, b]
+    
+    (c, s) = (cos(phi), sin(phi))
+    (dx, dy) = ((a[0] - b[0])/2, (a[1] - b[1])/2)
+    (x1, y1) = (c*dx + s*dy, -s*dx + c*dy)
+    
+    # Scale radii up if they're too small to reach.
+    (rx, ry) = (abs(rx), abs(ry))
+    lam = (x1/rx)**2 + (y1/ry)**2
+    if lam > 1.0:
+        (rx, ry) = (rx*sqrt(lam), ry*sqrt(lam))
+    
+    num = max(0.0, (rx*ry)**2 - (rx*y1)**2 - (ry*x1)**2)
+    k = sqrt(num / ((rx*y1)**2 + (ry*x1)**2))
+    if large == sweep:
+        k = -k
+    (cx1, cy1) = (k*rx*y1/ry, -k*ry*x1/rx)
+    center = (c*cx1 - s*cy1 + (a[0] + b[0])/2, s*cx1 + c*cy1 + (a[1] + b[1])/2)
+    
+    t0 = atan2((y1 - cy1)/ry, (x1 - cx1)/rx)
+    t1 = atan2((-y1 - cy1)/ry, (-x1 - cx1)/rx)
+    dt = (t1 - t0) % (2*pi)
+    if not sweep:
+        dt -= 2*pi
+    
+    # Flatten on the unit circle, tolerance scaled by the larger radius.
+    unit = arc_pts((0.0, 0.0), 1.0, t0, dt, tolerance / max(rx, ry))
+    pts = [(center[0] + c*rx*x - s*ry*y, center[1] + s*rx*x + c*ry*y)
+           for (x, y) in unit]
+    return [a] + pts[1:-1] + [b]
+
+
+def svg_path_entities(d='', tolerance=0.01):
+    '''Generate entities from SVG path data, one per subpath.
+    '''
+    tokens = [(m.group(1), m.group(2)) for m in re_svg_path.finditer(d)]
+    pos = 0
+    
+    def nums(n):
+        nonlocal pos
+        v = [float(t[1]) for t in tokens[pos:pos+n]]
+        pos += n
+        return v
+    
+    cur = start = (0.0, 0.0)
+    pts = []
+    beziers = []
+    cmd = None
+    prev = (None, None)
+    while pos < len(tokens):
+        if tokens[pos][0] is not None:
+            cmd = tokens[pos][0]
+            pos += 1
+        elif cmd is None:
+            break
+        rel = cmd.islower()
+        C = cmd.upper()
+        o = cur if rel else (0.0, 0.0)
+        p = lambda x, y: (o[0] + x, o[1] + y)
+        ctrl = None
+    
+        if C == 'M':
+            if len(pts) > 1:
+                yield entity(pts, beziers)
+            cur = start = p(*nums(2))
+            (pts, beziers) = ([cur], [])
+            # Further pairs after a move are lines.
+            cmd = 'l' if rel else 'L'
+            continue
+        elif C == 'Z':
+            if len(pts) > 1 and pts[-1] == start:
+                pts = pts[:-1]
+            if len(pts) > 1:
+                yield entity(pts, beziers, True)
+            cur = start
+            (pts, beziers) = ([cur], [])
+            continue
+        elif C == 'L':
+            new = [p(*nums(2))]
+        elif C == 'H':
+            x = nums(1)[0]
+            new = [(o[0] + x if rel else x, cur[1])]
+        elif C == 'V':
+            y = nums(1)[0]
+            new = [(cur[0], o[1] + y if rel else y)]
+        elif C in 'CSQT':
+            if C == 'C':
+                v = nums(6)
+                P = [cur, p(v[0], v[1]), p(v[2], v[3]), p(v[4], v[5])]
+            elif C == 'Q':
+                v = nums(4)
+                P = [cur, p(v[0], v[1]), p(v[2], v[3])]
+            else:
+                # Smooth curves reflect the previous control point, if the
+                #   previous command was the same kind of curve.
+                (pc, pctrl) = prev
+                smooth = pc is not None and (pc in 'CS' if C == 'S' else pc in 'QT')
+                r = (2*cur[0] - pctrl[0], 2*cur[1] - pctrl[1]) if smooth else cur
+                if C == 'S':
+                    v = nums(4)
+                    P = [cur, r, p(v[0], v[1]), p(v[2], v[3])]
+                else:
+                    v = nums(2)
+                    P = [cur, r, p(v[0], v[1])]
+            ctrl = P[-2]
+            beziers.append(P)
+            new = bezier_pts(P, tolerance)[1:]
+        elif C == 'A':
+            v = nums(7)
+            new = svg_arc_pts(cur, p(v[5], v[6]), v[0], v[1], radians(v[2]),
+                              bool(v[3]), bool(v[4]), tolerance)[1:]
+        else:
+            break
+    
+        prev = (C, ctrl) if ctrl is not None else (None, None)
+        pts += new
+        cur = new[-1]
+    
+    if len(pts) > 1:
+        yield entity(pts, beziers)
+
+
+def svg_entities(f=None, tolerance=0.01):
+    '''Generate entities from the shapes in an SVG file.
+Y is flipped so that up is positive, as it is for the machine.
+Transforms aren't applied, so drawings should be flattened before export.
+    '''
+    import xml.etree.ElementTree as ET
+    
+    flip = lambda e: entity([(x, 0.0 - y) for (x, y) in e['pts']],
+                            [[(x, 0.0 - y) for (x, y) in P] for P in e['beziers']],
+                            e['closed'])
+    num = lambda el, k: float(re.sub(r'[a-z]+$', '', el.get(k, '0')))
+    
+    for (event, el) in ET.iterparse(f):
+        tag = el.tag.split('}')[-1]
+        es = []
+        if tag == 'path':
+            es = svg_path_entities(el.get('d', ''), tolerance)
+        elif tag in ['polygon', 'polyline']:
+            v = [float(i) for i in re.split(r'[\s,]+', el.get('points', '').strip()) if len(i)]
+            pts = [(v[i], v[i+1]) for i in range(0, len(v) - 1, 2)]
+            es = [entity(pts, [], tag == 'polygon')]
+        elif tag == 'line':
+            es = [entity([(num(el, 'x1'), num(el, 'y1')),
+                          (num(el, 'x2'), num(el, 'y2'))])]
+        elif tag == 'rect':
+            (x, y, w, h) = [num(el, k) for k in ['x', 'y', 'width', 'height']]
+            es = [entity([(x, y), (x + w, y), (x + w, y + h), (x, y + h)], [], True)]
+        elif tag == 'circle':
+            pts = arc_pts((num(el, 'cx'), num(el, 'cy')), num(el, 'r'), 0.0,
+                          2*pi, tolerance)
+            es = [entity(pts[:-1], [], True)]
+    
+        for e in es:
+            yield flip(e)
+    
+        # Free elements as they're finished with.
+        el.clear()
+
+
+def join_entities(entities=[], tolerance=0.01):
+    '''Return contours made by joining entities whose ends are within
+  tolerance of each other, reversing entities where needed.
+Closed entities are contours already. Ends are found through a grid index
+  with cells of size tolerance, so only neighbouring cells are searched.
+    '''
+    assert isinstance(tolerance, float) and tolerance > 0.0
+    
+    contours = []
+    opens = []
+    for e in entities:
+        if e['closed']:
+            contours.append(e)
+        elif len(e['pts']) > 1:
+            opens.append(e)
+    
+    cell = lambda pt: (int(floor(pt[0] / tolerance)), int(floor(pt[1] / tolerance)))
+    grid = {}
+    for i, e in enumerate(opens):
+        for end in [0, -1]:
+            grid.setdefault(cell(e['pts'][end]), []).append((i, end))
+    
+    used = [False] * len(opens)
+    
+    def take(pt):
+        # Return (index, end) of an unused entity with an end near pt.
+        (cx, cy) = cell(pt)
+        for dx in [-1, 0, 1]:
+            for dy in [-1, 0, 1]:
+                for (i, end) in grid.get((cx + dx, cy + dy), []):
+                    if not used[i] and \
+                       distance_between_pts(pt, opens[i]['pts'][end]) <= tolerance:
+                        used[i] = True
+                        return (i, end)
+        return None
+    
+    def reverse(e):
+        return entity(e['pts'][::-1], [P[::-1] for P in e['beziers'][::-1]])
+    
+    for i in range(len(opens)):
+        if used[i]:
+            continue
+        used[i] = True
+        pts = list(opens[i]['pts'])
+        beziers = list(opens[i]['beziers'])
+    
+        # Extend forwards from the end, then backwards from the start.
+        closed = lambda: len(pts) > 2 and \
+                         distance_between_pts(pts[0], pts[-1]) <= tolerance
+        for forwards in [True, False]:
+            while not closed():
+                found = take(pts[-1] if forwards else pts[0])
+                if found is None:
+                    break
+                (j, end) = found
+                e = opens[j]
+                if forwards:
+                    if end != 0:
+                        e = reverse(e)
+                    pts += e['pts'][1:]
+                    beziers += e['beziers']
+                else:
+                    if end == 0:
+                        e = reverse(e)
+                    pts = e['pts'][:-1] + pts
+                    beziers = e['beziers'] + beziers
+    
+        if closed():
+            contours.append(entity(pts[:-1], beziers, True))
+        else:
+            contours.append(entity(pts, beziers, False))
+    
+    return contours
+
+
+def read_drawing(fname='', tolerance=0.01):
+    '''Return contours from a DXF or SVG file, chosen by extension.
+    '''
+    if fname.lower().endswith('.svg'):
+        return join_entities(svg_entities(fname, tolerance), tolerance)
+    with open(fname) as fd:
+        return join_entities(dxf_entities(fd, tolerance), tolerance)
+
+
+if __name__ == '__main__':
+    import argparse
+    
+    parser = argparse.ArgumentParser()
+    
+    parser.add_argument('input',
+                        help='DXF or SVG file to read')
+    
+    parser.add_argument('--tolerance',
+                        action='store',
+                        default=0.01,
+                        type=float,
+                        help='largest gap to join and chord error of curves (mm)')
+    
+    args = parser.parse_args()
+    
+    out = []
+    for i, c in enumerate(read_drawing(args.input, args.tolerance)):
+        (x0, y0) = (min([p[0] for p in c['pts']]), min([p[1] for p in c['pts']]))
+        (x1, y1) = (max([p[0] for p in c['pts']]), max([p[1] for p in c['pts']]))
+        out += ['%d: %s %d points %d beziers (%0.2f, %0.2f) to (%0.2f, %0.2f)' % (
+                i, 'closed' if c['closed'] else 'open', len(c['pts']),
+                len(c['beziers']), x0, y0, x1, y1)]
+    print('\n'.join(out))
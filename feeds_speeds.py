@@ -0,0 +1,98 @@
+# Library of tools and materials for calculating feeds and speeds.
+# Feedrate comes from the chip load, the thickness each flute takes per turn,
+#   so feedrate = rpm * flutes * chip load, and depth and width of cut come
+#   from the material as fractions of the endmill diameter.
+# Values for acrylic and MDF are set from cuts with a 2 flute 3mm endmill at
+#   10000rpm, where acrylic was just on the slow side at 400mm/minute and too
+#   fast at 500, and 660 was about right for MDF, cutting 0.8mm and 1.0mm
+#   deep passes.
+
+import bisect
+
+from math_base import *
+
+
+def tool_spec(diameter=3.0, flutes=2, flute_length=12.0):
+    '''Return a tool for feeds_speeds(), a flat endmill.
+    '''
+    assert isinstance(diameter, float) and diameter > 0.0
+    assert isinstance(flutes, int) and flutes > 0
+    assert isinstance(flute_length, float) and flute_length > 0.0
+    
+    return {'diameter': diameter, 'flutes': flutes, 'flute_length': flute_length}
+
+
+def material_spec(chipload=[(3.0, 0.03)], doc=0.3, woc=0.4, plunge=0.5):
+    '''Return a material for feeds_speeds().
+chipload is a list of (diameter, chip load) pairs in increasing diameter,
+  in mm per flute per turn.
+doc is the deepest pass, and woc the widest stepover, as fractions of the
+  endmill diameter, and plunge is the plungerate as a fraction of feedrate.
+    '''
+    assert isinstance(chipload, list) and len(chipload) > 0
+    assert all([a[0] < b[0] for a, b in zip(chipload, chipload[1:])])
+    assert isinstance(doc, float) and doc > 0.0
+    assert isinstance(woc, float) and 0.0 < woc <= 1.0
+    assert isinstance(plunge, float) and 0.0 < plunge <= 1.0
+    
+    return {'chipload': chipload, 'doc': doc, 'woc': woc, 'plunge': plunge}
+
+
+# Tools by name.
+tool_library = {
+                '1mm_2f': tool_spec(1.0, 2, 4.0),
+                '2mm_2f': tool_spec(2.0, 2, 8.0),
+                '3mm_1f': tool_spec(3.0, 1, 12.0),
+                '3mm_2f': tool_spec(3.0, 2, 12.0),
+                '3.175mm_2f': tool_spec(3.175, 2, 12.0),
+                '6mm_2f': tool_spec(6.0, 2, 22.0),
+               }
+
+# Materials by name.
+material_library = {
+                    'acrylic': material_spec([(1.0, 0.008), (3.0, 0.0225), (6.0, 0.045)],
+                                             doc=0.27),
+                    'mdf': material_spec([(1.0, 0.011), (3.0, 0.033), (6.0, 0.066)],
+                                         doc=0.33),
+                   }
+
+
+def chipload_lookup(mat={}, diameter=3.0):
+    '''Return chip load for an endmill diameter, interpolating between the
+  diameters listed for the material and holding the end values outside them.
+    '''
+    ds = [c[0] for c in mat['chipload']]
+    if diameter <= ds[0]:
+        return mat['chipload'][0][1]
+    if diameter >= ds[-1]:
+        return mat['chipload'][-1][1]
+    i = bisect.bisect_right(ds, diameter) - 1
+    ((d0, c0), (d1, c1)) = (mat['chipload'][i], mat['chipload'][i+1])
+    return c0 + (c1 - c0) * (diameter - d0) / (d1 - d0)
+
+
+def feeds_speeds(tool={}, mat={}, rpm=10000.0, feedrate_max=1500.0):
+    '''Return dict of feedrate and plungerate (mm/minute), pitch (depth of
+  each pass) and stepover (mm) for cutting a material with a tool.
+Tools and materials are dicts from tool_spec() and material_spec(), or
+  names in tool_library and material_library.
+Feedrate is limited to feedrate_max, what the machine can manage, and pitch
+  to the flute length.
+    '''
+    if isinstance(tool, str):
+        tool = tool_library[tool]
+    if isinstance(mat, str):
+        mat = material_library[mat]
+    assert isinstance(rpm, float) and rpm > 0.0
+    assert isinstance(feedrate_max, float) and feedrate_max > 0.0
+    
+    d = tool['diameter']
+    feedrate = min(rpm * tool['flutes'] * chipload_lookup(mat, d), feedrate_max)
+    
+    # Round off digits which mean nothing on a real machine.
+    return {
+            'feedrate': round(feedrate, 1),
+            'plungerate': round(feedrate * mat['plunge'], 1),
+            'pitch': round(min(d * mat['doc'], tool['flute_length']), 4),
+            'stepover': round(d * mat['woc'], 4),
+           }
@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+# Compensate for backlash by taking up the slack whenever an axis reverses.
+# When an axis changes direction the motor turns through the backlash before
+#   the tool moves, so a short take-up move of the lash on that axis alone is
+#   inserted first, and every following position is offset by it until the
+#   axis reverses again.
+# This gives the same accuracy as anti-backlash point drilling (--ablpd) on
+#   corners without the extra plunges.
+# Axes are assumed to have last moved in the positive direction, so zero each
+#   axis by approaching from below. At the end each axis is moved back to
+#   match, so the next program can assume the same.
+
+from gcode_normalize import *
+
+
+def arc_pieces(start=(0.0, 0.0, 0.0), end=(0.0, 0.0, 0.0), center=(0.0, 0.0), direction='G2'):
+    '''Return the end points of an XY arc split wherever X or Y reverses,
+  which is where it crosses a horizontal or vertical through its centre.
+Z changes evenly with angle, as for a helix.
+    '''
+    r = distance_between_pts(start[:2], center)
+    a0 = atan2(start[1] - center[1], start[0] - center[0])
+    a1 = atan2(end[1] - center[1], end[0] - center[0])
+    
+    # Sweep is negative for CW, with start equal to end a full circle.
+    if direction == 'G2':
+        sweep = -((a0 - a1) % (2*pi) or 2*pi)
+    else:
+        sweep = (a1 - a0) % (2*pi) or 2*pi
+    
+    # Fractions of the sweep at each quarter turn, skipping the ends, with
+    #   exact directions so the points don't pick up rounding errors.
+    quarters = [(1.0, 0.0), (0.0, 1.0), (-1.0, 0.0), (0.0, -1.0)]
+    ts = []
+    for q in range(-8, 9):
+        t = (q*pi/2 - a0) / sweep
+        if 1e-9 < t < 1.0 - 1e-9:
+            ts.append((t, quarters[q % 4]))
+    
+    pts = []
+    for (t, (dx, dy)) in sorted(ts):
+        pts.append((center[0] + r*dx, center[1] + r*dy,
+                    start[2] + (end[2] - start[2])*t))
+    return pts + [end]
+
+
+def backlash_moves(moves=[], lash={}, stats=None):
+    '''Generate lines of gcode for parsed absolute (G90) moves with take-up
+  moves added wherever an axis with lash reverses.
+lash is a dict of backlash by axis letter, such as {'X': 0.05, 'Y': 0.08}.
+Arcs in the XY plane are split where X or Y reverses part way round,
+  arcs in other planes are only compensated between moves.
+If stats is a dict it's updated with the number of take-ups on each axis.
+    '''
+    assert isinstance(lash, dict)
+    assert all([l in 'XYZ' and lash[l] >= 0.0 for l in lash])
+    
+    if stats is None:
+        stats = {}
+    stats['takeups'] = dict([(l, 0) for l in 'XYZ'])
+    
+    # Positive motion needs no offset, negative motion is offset by -lash.
+    direction = [1.0, 1.0, 1.0]
+    offset = [0.0, 0.0, 0.0]
+    
+    def takeup(motion, start, end):
+        # Return a take-up line if an axis reverses from start to end.
+        axes = {}
+        for i, l in enumerate('XYZ'):
+            d = end[i] - start[i]
+            if lash.get(l, 0.0) == 0.0 or abs(d) < 1e-9 or (d > 0.0) == (direction[i] > 0.0):
+                continue
+            direction[i] = 1.0 if d > 0.0 else -1.0
+            offset[i] = 0.0 if d > 0.0 else -lash[l]
+            axes[l] = start[i] + offset[i]
+            stats['takeups'][l] += 1
+        if not len(axes):
+            return None
+        return ' '.join([motion] + ['%s%s' % (l, floatf(axes[l] + 0.0)) for l in 'XYZ' if l in axes])
+    
+    # Arcs only need splitting if X or Y have lash.
+    split = lash.get('X', 0.0) > 0.0 or lash.get('Y', 0.0) > 0.0
+    
+    # Lines after the last move are held back so the axes can be restored
+    #   before them.
+    held = []
+    end = (0.0, 0.0, 0.0)
+    for move in moves:
+        if move['motion'] is None:
+            held.append(move['raw'])
+            continue
+        assert move['distance'] == 'G90', 'Line %d: program must be absolute, see gcode_normalize.py' % move['n']
+        for line in held:
+            yield line
+        held = []
+    
+        (start, end) = (move['start'], move['end'])
+        motion = 'G0' if move['motion'] == 'G0' else 'G1'
+    
+        # A take-up changes the motion mode, so restore it on the move.
+        words = move['words']
+        if not any([w[0] == 'G' and 'G' + w[1] in motion_modes for w in words]):
+            words = [('G', move['motion'][1:])] + words
+    
+        if move['motion'] in ['G0', 'G1'] or move['plane'] != 'G17' or not split:
+            line = takeup(motion, start, end)
+            if line is not None:
+                yield line
+            axes = dict(move['axes'])
+            for i, l in enumerate('XYZ'):
+                if l in axes:
+                    axes[l] = end[i] + offset[i]
+            yield gcode_format(dict(move, words=words), axes)
+            continue
+    
+        # Each axis only moves one way along a piece of arc, and the centre
+        #   is offset along with the start, so I J stay relative to it.
+        c = (start[0] + move['axes'].get('I', 0.0), start[1] + move['axes'].get('J', 0.0))
+        prev = start
+        for i, p in enumerate(arc_pieces(start, end, c, move['motion'])):
+            line = takeup(motion, prev, p)
+            if line is not None:
+                yield line
+            axes = {'X': p[0] + offset[0], 'Y': p[1] + offset[1],
+                    'I': c[0] - prev[0], 'J': c[1] - prev[1]}
+            if 'Z' in move['axes']:
+                axes['Z'] = p[2] + offset[2]
+            if i == 0:
+                # Other words such as feedrate only need to be on the first piece.
+                yield gcode_format(dict(move, words=words), axes)
+            else:
+                yield ' '.join([move['motion']] + ['%s%s' % (l, floatf(axes[l] + 0.0)) for l in axis_letters if l in axes])
+            prev = p
+    
+    # Move back the positive way to where the program ended.
+    restore = ['%s%s' % (l, floatf(end[i] + 0.0)) for i, l in enumerate('XYZ') if offset[i] != 0.0]
+    if len(restore):
+        yield ' '.join(['G0'] + restore)
+    for line in held:
+        yield line
+
+
+if __name__ == '__main__':
+    import argparse
+    import sys
+    
+    parser = argparse.ArgumentParser()
+    
+    parser.add_argument('input',
+                        nargs='?',
+                        default='-',
+                        help='gcode file to read, or - for STDIN')
+    
+    parser.add_argument('--x_lash',
+                        action='store',
+                        default=0.0,
+                        type=float,
+                        help='backlash of X axis (mm)')
+    
+    parser.add_argument('--y_lash',
+                        action='store',
+                        default=0.0,
+                        type=float,
+                        help='backlash of Y axis (mm)')
+    
+    parser.add_argument('--z_lash',
+                        action='store',
+                        default=0.0,
+                        type=float,
+                        help='backlash of Z axis (mm)')
+    
+    args = parser.parse_args()
+    
+    lash = {'X': args.x_lash, 'Y': args.y_lash, 'Z': args.z_lash}
+    
+    # Make the program absolute first, as directions are found from positions.
+    fd = sys.stdin if args.input == '-' else open(args.input)
+    moves = gcode_parse(normalize_moves(gcode_parse(fd), 'G90'))
+    stats = {}
+    for line in backlash_moves(moves, lash, stats):
+        sys.stdout.write(line + '\n')
+    sys.stderr.write('take-ups: %s\n' % ' '.join(['%s%d' % (l, stats['takeups'][l]) for l in 'XYZ']))
@@ -8,11 +8,170 @@ def floatf(f=0.0):
     return ('%0.4f' % f).rstrip('0').rstrip('.')
 
 
+# Fixed point coordinates are integers in units of 1/FIXED_SCALE mm, which is
+#   the same resolution floatf() writes.
+# Relative moves calculated as differences between fixed point positions add
+#   up exactly, so closed loops always return to where they started.
+FIXED_DIGITS = 4
+FIXED_SCALE = 10**FIXED_DIGITS
+
+
+def to_fixed(f=0.0):
+    '''Convert a float in mm to a fixed point integer.
+    '''
+    return int(round(f * FIXED_SCALE))
+
+
+def fixedf(n=0):
+    '''Format fixed point integers in gcode to the same minimal form as floatf().
+Only integer operations are used, which is faster than float formatting.
+    '''
+    if n < 0:
+        (i, f) = divmod(-n, FIXED_SCALE)
+        sign = '-'
+    else:
+        (i, f) = divmod(n, FIXED_SCALE)
+        sign = ''
+    
+    if f == 0:
+        return sign + str(i)
+    return sign + str(i) + '.' + str(f).rjust(FIXED_DIGITS, '0').rstrip('0')
+
+
+def pts_to_fixed(pts=[]):
+    '''Convert a list of points in mm to fixed point integers.
+    '''
+    assert isinstance(pts, list)
+    return [tuple([to_fixed(i) for i in pt]) for pt in pts]
+
+
+def fixed_vectors_between_pts(pts=[]):
+    '''Return vectors between fixed point points, like vectors_between_pts().
+Last vector is the path between the first and last point, creating a loop,
+  and the vectors always sum to exactly zero.
+    '''
+    assert isinstance(pts, list) and len(pts) > 0
+    l_pts = len(pts)
+    
+    return [tuple([b - a for a, b in zip(pts[i], pts[(i+1) % l_pts])]) \
+            for i in range(l_pts)]
+
+
+def fixed_steps(cuts=[]):
+    '''Return fixed point step-downs which add up exactly to the total depth.
+Each step is the difference between rounded cumulative depths, so rounding
+  error is carried forward instead of accumulating.
+    '''
+    assert isinstance(cuts, list)
+    return [to_fixed(b) - to_fixed(b - c) for b, c in zip(depth_levels(cuts), cuts)]
+
+
+def depth_passes(depth=0.0, pitch=0.0, min_pitch=0.0, finishing=0.0):
+    '''Return a list of step-downs which cut to depth in the fewest passes.
+Roughing passes are all the same size and no deeper than pitch, followed by
+  a single finishing pass if one is requested.
+min_pitch is the shallowest roughing pass allowed, to avoid rubbing.
+    '''
+    assert isinstance(depth, float) and depth > 0.0
+    assert isinstance(pitch, float) and pitch > 0.0
+    assert isinstance(min_pitch, float) and 0.0 <= min_pitch <= pitch
+    assert isinstance(finishing, float) and 0.0 <= finishing < depth
+    
+    rough = depth - finishing
+    
+    # Small tolerance stops float error adding a pass, e.g. 0.3/0.1 > 3.
+    n_passes = max(1, int(ceil(rough / pitch - 1e-9)))
+    step = rough / n_passes
+    assert n_passes == 1 or step >= min_pitch, \
+        'No balanced passes between min_pitch and pitch.'
+    
+    cuts = [step for l in range(n_passes)]
+    if finishing > 0.0:
+        cuts.append(finishing)
+    
+    return cuts
+
+
+def depth_levels(cuts=[]):
+    '''Return the cumulative depths reached by a list of step-downs.
+    '''
+    assert isinstance(cuts, list) and len(cuts) > 0
+    
+    levels = []
+    d = 0.0
+    for c in cuts:
+        d += c
+        levels.append(d)
+    
+    return levels
+
+
+def engagement_angle(woc=0.0, radius=0.0, path_radius=0.0):
+    '''Return the angle of an endmill in contact with the material (radians)
+  when cutting woc wider than what was already cut.
+path_radius is the radius of the curve the centre of the endmill follows,
+  positive with the new wall on the outside of the curve, such as cutting
+  inside a hole, negative with it on the inside, or 0.0 for a straight line.
+    '''
+    assert isinstance(woc, float) and woc >= 0.0
+    assert isinstance(radius, float) and radius > 0.0
+    assert isinstance(path_radius, float)
+    
+    if woc >= 2*radius:
+        return pi
+    
+    # Angle from the wall to where the endmill leaves the old cut, found
+    #   from the distance of each point on the endmill to the curve centre.
+    rc = abs(path_radius)
+    if path_radius > 0.0:
+        rp = rc + radius - woc
+        c = (rp**2 - rc**2 - radius**2) / (2*rc*radius)
+    elif path_radius < 0.0:
+        rp = rc - radius + woc
+        c = (rc**2 + radius**2 - rp**2) / (2*rc*radius)
+    else:
+        c = 1.0 - woc/radius
+    return acos(min(1.0, max(-1.0, c)))
+
+
+def feed_factor(woc=0.0, radius=0.0, path_radius=0.0, limit=2.0):
+    '''Return what to multiply a feedrate chosen for a straight slot by to
+  keep the same chip thickness for a cut woc wide, see engagement_angle().
+With less than half the endmill engaged the chips are thinner, and on a
+  curve the edge on the outside moves faster than the centre.
+The result is kept between 1/limit and limit.
+    '''
+    assert isinstance(limit, float) and limit >= 1.0
+    
+    a = engagement_angle(woc, radius, path_radius)
+    thinning = sin(a) if a < pi/2 else 1.0
+    
+    edge = 1.0
+    if path_radius != 0.0:
+        rc = abs(path_radius)
+        if path_radius > 0.0 or woc >= 2*radius:
+            edge = (rc + radius) / rc
+        else:
+            edge = (rc - radius) / rc
+    
+    # Nearly nothing engaged would need an endless feedrate.
+    if thinning * edge <= 1.0 / limit:
+        return limit
+    return max(1.0 / limit, 1.0 / (thinning * edge))
+
+
+def engagement_feedrate(feedrate=0.0, woc=0.0, radius=0.0, path_radius=0.0):
+    '''Return feedrate adjusted by feed_factor(), to 0.1mm/minute.
+    '''
+    assert isinstance(feedrate, float) and feedrate > 0.0
+    return round(feedrate * feed_factor(woc, radius, path_radius), 1)
+
+
 def points_path(pts=[], feedrate=0.0):
     '''Generate gcode to make linear paths between a list of given points. 
 Due to the way gcode works, this is good for both relative and absolute modes.
     '''
-
+    
     assert isinstance(pts, list) and len(pts) > 0
     assert isinstance(feedrate, float) and feedrate > 0.0
     
@@ -26,6 +185,18 @@ Due to the way gcode works, this is good for both relative and absolute modes.
     return '\n'.join(g)
 
 
+def fixed_points_path(pts=[], feedrate=0.0):
+    '''Generate gcode to make linear paths between fixed point points.
+Same as points_path() but without any float formatting.
+    '''
+    assert isinstance(pts, list) and len(pts) > 0
+    assert isinstance(feedrate, float) and feedrate > 0.0
+    
+    g = ['F%s' % floatf(feedrate)]
+    g += ['G1 X%s Y%s' % (fixedf(p[0]), fixedf(p[1])) for p in pts]
+    return '\n'.join(g)
+
+
 def helix_path(
                radius=0.0,
                depth=0.0,
@@ -50,6 +221,108 @@ def helix_path(
                                                      }
 
 
+def ramp_path(
+              pts=[],
+              depth=0.0,
+              angle=0.0,
+              feedrate=0.0,
+             ):
+    '''Generate gcode to descend by depth along the start of a relative path.
+The tool ramps forwards along the path for half of the depth, then back to
+  the start of the path for the other half, so it only cuts where the path
+  will cut anyway and finishes where it started.
+If the path is too short for that at angle, the tool goes forwards and back
+  along the whole path as many times as needed, so the ramp is never steeper
+  than angle.
+Angle is the ramp angle from horizontal in radians.
+Assume in relative (G91) mode.
+    '''
+    assert isinstance(pts, list) and len(pts) > 0
+    assert isinstance(depth, float) and depth >= 0.0
+    assert isinstance(angle, float) and 0.0 < angle < pi/2
+    assert isinstance(feedrate, float) and feedrate > 0.0
+    
+    # Horizontal distance each way, limited to once round the path, and
+    #   the number of times there and back to cover the whole ramp.
+    perimeter = sum([sqrt(p[0]**2 + p[1]**2) for p in pts])
+    assert perimeter > 0.0
+    run = min(depth / tan(angle) / 2, perimeter)
+    n_trips = max(1, int(ceil(depth / tan(angle) / 2 / run - 1e-9)))
+    
+    # Walk along the path, splitting the last segment where the run ends.
+    fwd = []
+    remaining = run
+    for p in pts:
+        l = sqrt(p[0]**2 + p[1]**2)
+        if l == 0.0:
+            continue
+        if l >= remaining:
+            t = remaining / l
+            fwd.append((p[0]*t, p[1]*t, remaining))
+            break
+        fwd.append((p[0], p[1], l))
+        remaining -= l
+    
+    back = [(-p[0], -p[1], p[2]) for p in reversed(fwd)]
+    
+    # Z steps are taken between rounded levels so they sum to exactly depth.
+    g = []
+    g.append('F%s' % floatf(feedrate))
+    z = 0.0
+    z_prev = 0.0
+    for p in (fwd + back) * n_trips:
+        z += depth * p[2] / run / 2 / n_trips
+        g.append('G1 X%(x)s Y%(y)s Z%(z)s' % {
+                                              'x': floatf(p[0]),
+                                              'y': floatf(p[1]),
+                                              'z': floatf(z_prev - round(z, 4)),
+                                             })
+        z_prev = round(z, 4)
+    return '\n'.join(g)
+
+
+def helix_entry_path(
+                     center=(0.0, 0.0),
+                     depth=0.0,
+                     angle=0.0,
+                     feedrate=0.0,
+                     direction='ccw',
+                    ):
+    '''Generate gcode to descend by depth on a helix through the current point.
+Center is the centre of the helix relative to the current position.
+The helix is split into whole turns no steeper than angle, which is measured
+  from horizontal in radians.
+Assume in relative (G91) mode.
+    '''
+    assert isinstance(center, tuple) and len(center) == 2
+    assert isinstance(depth, float) and depth >= 0.0
+    assert isinstance(angle, float) and 0.0 < angle < pi/2
+    assert isinstance(feedrate, float) and feedrate > 0.0
+    assert isinstance(direction, str) and direction in ['cw', 'ccw']
+    
+    if direction == 'cw':
+        g_dir = 'G2'
+    else:
+        g_dir = 'G3'
+    
+    radius = sqrt(center[0]**2 + center[1]**2)
+    assert radius > 0.0
+    n_turns = max(1, int(ceil(depth / (2*pi*radius*tan(angle)) - 1e-9)))
+    
+    # Z steps are taken between rounded levels so they sum to exactly depth.
+    g = []
+    for l in range(n_turns):
+        g.append('%(dir)s X0 Y0 Z%(z)s I%(i)s J%(j)s F%(f)s' % {
+                                'dir': g_dir,
+                                'f': floatf(feedrate),
+                                'z': floatf(round(depth*l/n_turns, 4) - \
+                                            round(depth*(l+1)/n_turns, 4)),
+                                'i': floatf(center[0]),
+                                'j': floatf(center[1]),
+                               })
+    return '\n'.join(g)
+
+
 def point_drill_abs(
                     pt=(0.0, 0.0),
                     depth=3.0,
@@ -145,9 +418,24 @@ Assume in relative (G91) mode.
     assert isinstance(plungerate, float) and plungerate > 0.0
     assert isinstance(clearance, float) and clearance > 0.0
     
-    # Use points to calculate the relative movements.
-    rels = vectors_between_pts(pts)
-        
-    g = [point_drill_rel(pt, depth, plungerate, clearance) for pt in rels]
+    # Use fixed point positions to calculate the relative movements, so the
+    #   spindle ends exactly back at the start.
+    rels = fixed_vectors_between_pts(pts_to_fixed(pts))
+    
+    # Everything but XY is the same for every point so format it once.
+    drill = '\n'.join([
+                       'G0 Z%s' % floatf(clearance * -1),
+                       'G1 Z%(z)s F%(f)s' % {
+                                             'z': floatf(depth * -1),
+                                             'f':floatf(plungerate),
+                                            },
+                       'G1 Z%(z)s F%(f)s' % {
+                                             'z': floatf(depth),
+                                             'f':floatf(plungerate),
+                                            },
+                       'G0 Z%s' % floatf(clearance),
+                      ])
+    
+    g = ['G0 X%s Y%s\n%s' % (fixedf(pt[0]), fixedf(pt[1]), drill) for pt in rels]
     return '\n'.join(g)
 
@@ -0,0 +1,176 @@
+# Persistent on-disk cache of generated gcode.
+# Programs are stored zlib compressed, one file per program, named by a hash
+#   of the source of the generator's module and every cncutils module it
+#   imports, plus the function name and its parameters, so editing any of
+#   them invalidates its old entries, whatever else happens to be loaded.
+# Files are read through mmap and touched on every hit, and the least
+#   recently used files are deleted when the cache grows too large.
+
+import hashlib
+import mmap
+import os
+import re
+import sys
+import zlib
+
+# Default location and size limit of the cache.
+cache_dir_default = os.path.join(os.path.expanduser('~'), '.cache', 'cncutils')
+cache_size_default = 64 * 2**20
+
+# Import statements, at any indent as some modules import inside functions.
+re_import = re.compile(r'^\s*(?:from\s+(\w+)\s+import|import\s+(\w+))', re.M)
+
+# Hash of module sources by generator module, calculated once per run.
+source_hashes = {}
+
+
+def module_sources(fname=''):
+    '''Return sorted paths of a module's source and of every module from this
+  directory it imports, directly or through other modules.
+    '''
+    here = os.path.dirname(os.path.abspath(__file__))
+    todo = [os.path.abspath(fname)]
+    found = set()
+    while len(todo):
+        fname = todo.pop()
+        if fname in found:
+            continue
+        found.add(fname)
+        with open(fname) as fd:
+            for m in re_import.findall(fd.read()):
+                dep = os.path.join(here, (m[0] or m[1]) + '.py')
+                if os.path.exists(dep):
+                    todo.append(dep)
+    
+    return tuple(sorted(found))
+
+
+def module_file(fn=None):
+    '''Return the source file of the module defining fn.
+    '''
+    return os.path.abspath(sys.modules[fn.__module__].__file__)
+
+
+def source_hash(fn=None):
+    '''Return a hash of the sources fn is generated from, see module_sources().
+    '''
+    fname = module_file(fn)
+    if fname not in source_hashes:
+        h = hashlib.sha1()
+        for f in module_sources(fname):
+            with open(f, 'rb') as fd:
+                h.update(os.path.basename(f).encode())
+                h.update(fd.read())
+        source_hashes[fname] = h.hexdigest()
+    
+    return source_hashes[fname]
+
+
+def cache_key(fn=None, kwargs={}):
+    '''Return the cache key for a call of fn with keyword arguments.
+Parameters are normalised by name order and ints given for floats are
+  converted, so equivalent calls share a key.
+    '''
+    assert callable(fn)
+    assert isinstance(kwargs, dict)
+    
+    params = []
+    for k in sorted(kwargs.keys()):
+        v = kwargs[k]
+        if isinstance(v, int) and not isinstance(v, bool):
+            v = float(v)
+        params.append((k, v))
+    
+    # Named by file, as a script's own module is __main__.
+    module = os.path.splitext(os.path.basename(module_file(fn)))[0]
+    
+    h = hashlib.sha1()
+    h.update(source_hash(fn).encode())
+    h.update(('%s.%s' % (module, fn.__name__)).encode())
+    h.update(repr(params).encode())
+    return h.hexdigest()
+
+
+def cache_read(fname=''):
+    '''Return the program stored in a cache file, or None if it is missing or
+  unreadable.
+    '''
+    try:
+        with open(fname, 'rb') as fd:
+            with mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                g = zlib.decompress(mm).decode()
+    except (OSError, ValueError, zlib.error):
+        return None
+    
+    # Mark as recently used for eviction, if allowed, as a read only cache
+    #   still works without it.
+    try:
+        os.utime(fname)
+    except OSError:
+        pass
+    return g
+
+
+def cache_write(fname='', g=''):
+    '''Store a program in a cache file.
+The file is written under a temporary name and renamed, so concurrent
+  readers never see a partial file.
+    '''
+    tmp = '%s.%d.tmp' % (fname, os.getpid())
+    with open(tmp, 'wb') as fd:
+        fd.write(zlib.compress(g.encode(), 9))
+    os.replace(tmp, fname)
+
+
+def cache_evict(cache_dir='', size=cache_size_default):
+    '''Delete least recently used cache files until the total is within size.
+    '''
+    assert isinstance(size, int) and size >= 0
+    
+    entries = []
+    for f in os.listdir(cache_dir):
+        if not f.endswith('.z'):
+            continue
+        fname = os.path.join(cache_dir, f)
+        try:
+            st = os.stat(fname)
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, fname))
+    
+    total = sum([e[1] for e in entries])
+    for (t, s, fname) in sorted(entries):
+        if total <= size:
+            break
+        try:
+            os.remove(fname)
+        except OSError:
+            pass
+        total -= s
+
+
+def cached_call(fn=None, cache_dir=cache_dir_default,
+                size=cache_size_default, **kwargs):
+    '''Return fn(**kwargs), reading it from the cache if it has been generated
+  before with the same parameters and sources.
+An empty or None cache_dir disables the cache.
+    '''
+    assert callable(fn)
+    
+    if not cache_dir:
+        return fn(**kwargs)
+    
+    fname = os.path.join(cache_dir, cache_key(fn, kwargs) + '.z')
+    g = cache_read(fname)
+    if g is not None:
+        return g
+    
+    g = fn(**kwargs)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        cache_write(fname, g)
+        cache_evict(cache_dir, size)
+    except OSError:
+        # A cache which can't be written shouldn't stop gcode being generated.
+        pass
+    return g
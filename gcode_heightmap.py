@@ -0,0 +1,289 @@
+#!/usr/bin/env python
+# Compensate for stock which isn't flat by probing its surface on a grid.
+# First run the probe program, which touches off with G38.2 at every grid
+#   point, saving the [PRB:...] reports GRBL sends back (gcode_stream.py
+#   writes them to STDOUT).
+# Then the compensation pass adds the interpolated surface height to every
+#   move, splitting long moves so they follow the surface between grid
+#   points.
+# Z should be zeroed on the surface at the first probe point, X0 Y0.
+
+import bisect
+import re
+
+from gcode_parse import *
+from patterns import *
+
+# Probe reports look like [PRB:0.000,0.000,-1.234:1].
+re_probe = re.compile(r'PRB:([-+0-9.]+),([-+0-9.]+),([-+0-9.]+)(?::([01]))?')
+
+
+def probe_grid_gcode(
+                     size=(100.0, 100.0),
+                     step=10.0,
+                     clearance=2.0,
+                     depth=5.0,
+                     feedrate=50.0,
+                    ):
+    '''Generate gcode to probe the surface at every point of a grid from X0 Y0
+  covering size, with points at most step apart.
+Rows run alternately back and forth to keep travel short.
+Assume spindle starts at X0 Y0 at clearance above the surface.
+    '''
+    assert isinstance(size, tuple) and len(size) == 2
+    assert isinstance(step, float) and step > 0.0
+    assert isinstance(clearance, float) and clearance > 0.0
+    assert isinstance(depth, float) and depth > 0.0
+    assert isinstance(feedrate, float) and feedrate > 0.0
+    
+    cols = max(1, int(ceil(size[0] / step))) + 1
+    rows = max(1, int(ceil(size[1] / step))) + 1
+    grid = pattern_grid((0.0, 0.0), (size[0] / (cols - 1), size[1] / (rows - 1)),
+                        cols, rows, serpentine=True)
+    
+    g = []
+    
+    # Select XY plane, units as millimeters, absolute positioning.
+    g.append('G17')
+    g.append('G21')
+    g.append('G90')
+    g.append('G0 Z%s' % floatf(clearance))
+    
+    for (x, y, r) in expand_pattern(grid):
+        g.append('G0 X%s Y%s' % (floatf(x), floatf(y)))
+        g.append('G38.2 Z%(z)s F%(f)s' % {
+                                         'z': floatf(depth * -1),
+                                         'f': floatf(feedrate),
+                                        })
+        g.append('G0 Z%s' % floatf(clearance))
+    
+    g.append('G0 X0 Y0')
+    
+    return '\n'.join(g)
+
+
+def heightmap_from_probes(lines=[]):
+    '''Return a heightmap from lines containing probe reports, or plain
+  "x y z" lines.
+Heights are relative to the first point, where Z was zeroed, and failed
+  probes are ignored.
+The points must form a complete rectangular grid.
+    '''
+    pts = {}
+    for line in lines:
+        m = re_probe.search(line)
+        if m:
+            if m.group(4) == '0':
+                continue
+            p = tuple([float(i) for i in m.groups()[:3]])
+        else:
+            v = line.replace(',', ' ').split()
+            if len(v) != 3:
+                continue
+            try:
+                p = tuple([float(i) for i in v])
+            except ValueError:
+                continue
+        pts[(round(p[0], 3), round(p[1], 3))] = p[2]
+        if len(pts) == 1:
+            ref = p
+    
+    assert len(pts) > 0, 'No probe points found'
+    
+    xs = sorted(set([k[0] for k in pts.keys()]))
+    ys = sorted(set([k[1] for k in pts.keys()]))
+    assert len(pts) == len(xs) * len(ys), 'Probe points are not a complete grid'
+    
+    # Probed in machine coordinates, so shift to put the first point at 0.
+    z = [[pts[(x, y)] - ref[2] for x in xs] for y in ys]
+    xs = [x - ref[0] for x in xs]
+    ys = [y - ref[1] for y in ys]
+    
+    return heightmap(xs, ys, z)
+
+
+def heightmap(xs=[0.0], ys=[0.0], z=[[0.0]]):
+    '''Return a heightmap with heights z[row][col] at grid positions xs, ys.
+The bilinear patch for each cell is calculated up front, as
+  z = a + b*u + c*v + d*u*v where u and v go from 0 to 1 across the cell, so
+  looking up a height is just a few multiplies.
+    '''
+    assert len(z) == len(ys) and all([len(r) == len(xs) for r in z])
+    
+    cells = {}
+    for row in range(max(1, len(ys) - 1)):
+        for col in range(max(1, len(xs) - 1)):
+            (c1, r1) = (min(col + 1, len(xs) - 1), min(row + 1, len(ys) - 1))
+            (z00, z10) = (z[row][col], z[row][c1])
+            (z01, z11) = (z[r1][col], z[r1][c1])
+            cells[(col, row)] = (z00, z10 - z00, z01 - z00, z11 - z10 - z01 + z00)
+    
+    return {'xs': xs, 'ys': ys, 'z': z, 'cells': cells}
+
+
+def heightmap_z(hm={}, pt=(0.0, 0.0)):
+    '''Return surface height at a point, holding the edge heights outside the
+  probed area.
+    '''
+    def locate(vs, v):
+        # Return (cell index, fraction across cell).
+        if len(vs) == 1 or v <= vs[0]:
+            return (0, 0.0)
+        if v >= vs[-1]:
+            return (len(vs) - 2, 1.0)
+        i = bisect.bisect_right(vs, v) - 1
+        return (i, (v - vs[i]) / (vs[i+1] - vs[i]))
+    
+    (col, u) = locate(hm['xs'], pt[0])
+    (row, v) = locate(hm['ys'], pt[1])
+    (a, b, c, d) = hm['cells'][(col, row)]
+    return a + b*u + c*v + d*u*v
+
+
+def compensate_moves(moves=[], hm={}, segment=5.0, stats=None):
+    '''Generate lines of gcode for parsed moves with the surface height added
+  to Z, in absolute (G90) mode.
+Lines and arcs in the XY plane are split into pieces no longer than segment,
+  so they follow the surface, arcs into smaller arcs.
+If stats is a dict it is updated with the number of lines in and out, and
+  the largest correction applied.
+    '''
+    assert isinstance(segment, float) and segment > 0.0
+    
+    if stats is None:
+        stats = {}
+    stats['lines_in'] = 0
+    stats['lines_out'] = 1
+    stats['max_offset'] = 0.0
+    
+    def at(x, y, z):
+        dz = heightmap_z(hm, (x, y))
+        stats['max_offset'] = max(stats['max_offset'], abs(dz))
+        return z + dz
+    
+    yield 'G90'
+    for move in moves:
+        stats['lines_in'] += 1
+        words = [w for w in move['words'] if not (w[0] == 'G' and 'G' + w[1] in distance_modes)]
+    
+        if move['motion'] is None or move['plane'] != 'G17':
+            if len(words) == len(move['words']):
+                stats['lines_out'] += 1
+                yield move['raw']
+            elif len(words) > 0:
+                stats['lines_out'] += 1
+                yield gcode_format(dict(move, words=words))
+            continue
+        move = dict(move, words=words)
+    
+        (start, end) = (move['start'], move['end'])
+        pieces = []
+        if move['motion'] in ['G0', 'G1']:
+            n = max(1, int(ceil(distance_between_pts(start[:2], end[:2]) / segment)))
+            for i in range(1, n + 1):
+                p = pt_between_pts(start, end, float(i) / n)
+                pieces.append({'X': p[0], 'Y': p[1], 'Z': at(*p)})
+        else:
+            # Split arcs into equal smaller arcs, with I J from each start.
+            c = (start[0] + move['axes'].get('I', 0.0),
+                 start[1] + move['axes'].get('J', 0.0))
+            r = distance_between_pts(start[:2], c)
+            a0 = atan2(start[1] - c[1], start[0] - c[0])
+            a1 = atan2(end[1] - c[1], end[0] - c[0])
+            if move['motion'] == 'G2':
+                sweep = -((a0 - a1) % (2*pi) or 2*pi)
+            else:
+                sweep = (a1 - a0) % (2*pi) or 2*pi
+            n = max(1, int(ceil(abs(sweep) * r / segment)))
+            prev = start
+            for i in range(1, n + 1):
+                a = a0 + sweep * i / n
+                p = (c[0] + r*cos(a), c[1] + r*sin(a),
+                     start[2] + (end[2] - start[2]) * i / n)
+                if i == n:
+                    p = end
+                pieces.append({'X': p[0], 'Y': p[1], 'Z': at(*p),
+                               'I': c[0] - prev[0], 'J': c[1] - prev[1]})
+                prev = p
+    
+        # Other words such as feedrate only need to be on the first piece.
+        stats['lines_out'] += len(pieces)
+        yield gcode_format(move, pieces[0])
+        for p in pieces[1:]:
+            yield ' '.join(['%s%s' % (l, floatf(p[l] + 0.0)) for l in axis_letters if l in p])
+
+
+if __name__ == '__main__':
+    import argparse
+    import sys
+    
+    parser = argparse.ArgumentParser()
+    
+    parser.add_argument('input',
+                        nargs='?',
+                        default='-',
+                        help='gcode file to compensate, or - for STDIN')
+    
+    parser.add_argument('--heightmap',
+                        action='store',
+                        default='',
+                        help='file of probe reports or "x y z" lines')
+    
+    parser.add_argument('--segment',
+                        action='store',
+                        default=5.0,
+                        type=float,
+                        help='longest move after splitting (mm)')
+    
+    parser.add_argument('--probe',
+                        action='store',
+                        default=None,
+                        nargs=2,
+                        type=float,
+                        help='instead write a probe program covering width and height (mm)')
+    
+    parser.add_argument('--step',
+                        action='store',
+                        default=10.0,
+                        type=float,
+                        help='largest distance between probe points (mm)')
+    
+    parser.add_argument('--clearance',
+                        action='store',
+                        default=2.0,
+                        type=float,
+                        help='clearance between probe points (mm)')
+    
+    parser.add_argument('--depth',
+                        action='store',
+                        default=5.0,
+                        type=float,
+                        help='furthest to probe below clearance (mm)')
+    
+    parser.add_argument('--feedrate',
+                        action='store',
+                        default=50.0,
+                        type=float,
+                        help='probe feedrate (mm/minute)')
+    
+    args = parser.parse_args()
+    
+    if args.probe is not None:
+        print(probe_grid_gcode(
+                               size=tuple(args.probe),
+                               step=args.step,
+                               clearance=args.clearance,
+                               depth=args.depth,
+                               feedrate=args.feedrate,
+                              ))
+    else:
+        with open(args.heightmap) as fd:
+            hm = heightmap_from_probes(fd)
+    
+        fd = sys.stdin if args.input == '-' else open(args.input)
+        stats = {}
+        for line in compensate_moves(gcode_parse(fd), hm, args.segment, stats):
+            sys.stdout.write(line + '\n')
+        sys.stderr.write('lines: %d in, %d out\nlargest correction: %s\n' % (
+                         stats['lines_in'], stats['lines_out'],
+                         floatf(stats['max_offset'])))
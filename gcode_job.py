@@ -0,0 +1,258 @@
+#!/usr/bin/env python
+# Combine operations which need different tools into one program.
+# Operations are grouped by tool so each tool is only loaded once, and the
+#   operations within each group are ordered to keep rapid travel short.
+# Each operation is a program run at an XY position, the same as
+#   pattern_gcode(), with any absolute moves shifted to that position.
+
+from gcode_base import *
+from gcode_transform import *
+from math_base import *
+
+
+def job_op(tool=1, pos=(0.0, 0.0), program='', z=None, name=''):
+    '''Return an operation for job_gcode().
+Program is normally relative (G91), absolute (G90) XY positions are taken
+  as relative to pos.
+Program must start and end at clearance above pos, like cherrymx_profile(),
+  unless z is given, in which case the spindle is moved to absolute height z
+  before the program and back to clearance afterwards, which suits the
+  output of the scripts.
+    '''
+    assert isinstance(tool, int) and tool > 0
+    assert isinstance(pos, tuple) and len(pos) == 2
+    assert isinstance(program, str)
+    assert z is None or isinstance(z, float)
+    
+    return {'tool': tool, 'pos': pos, 'program': program, 'z': z, 'name': name}
+
+
+def tour_length(pts=[], start=(0.0, 0.0)):
+    '''Return length of the path from start through pts in order.
+    '''
+    d = 0.0
+    for p in pts:
+        d += distance_between_pts(start, p)
+        start = p
+    return d
+
+
+def order_nearest(pts=[], start=(0.0, 0.0)):
+    '''Return indices of pts in an order giving a short path from start.
+The path is built by always moving to the nearest unvisited point, then
+  improved with 2-opt, reversing sections which make the path shorter.
+    '''
+    remaining = list(range(len(pts)))
+    order = []
+    cur = start
+    while len(remaining):
+        i = min(remaining, key=lambda j: distance_between_pts(cur, pts[j]))
+        remaining.remove(i)
+        order.append(i)
+        cur = pts[i]
+    
+    # Open path, so the start point is fixed but the end is free.
+    path = [start] + [pts[i] for i in order]
+    improved = True
+    while improved:
+        improved = False
+        for a in range(len(path) - 2):
+            for b in range(a + 2, len(path)):
+                before = distance_between_pts(path[a], path[a+1])
+                after = distance_between_pts(path[a], path[b])
+                if b + 1 < len(path):
+                    before += distance_between_pts(path[b], path[b+1])
+                    after += distance_between_pts(path[a+1], path[b+1])
+                if after < before - 1e-9:
+                    path[a+1:b+1] = reversed(path[a+1:b+1])
+                    order[a:b] = reversed(order[a:b])
+                    improved = True
+    
+    return order
+
+
+def job_order(ops=[], start_tool=None):
+    '''Return ops in machining order.
+Tools are used in the order they first appear in ops, except that a tool
+  already in the spindle is used first, so there is one tool change for each
+  other tool.
+    '''
+    tools = []
+    for op in ops:
+        if op['tool'] not in tools:
+            tools.append(op['tool'])
+    if start_tool in tools:
+        tools.remove(start_tool)
+        tools.insert(0, start_tool)
+    
+    ordered = []
+    pos = (0.0, 0.0)
+    for t in tools:
+        group = [op for op in ops if op['tool'] == t]
+        order = order_nearest([op['pos'] for op in group], pos)
+        ordered += [group[i] for i in order]
+        pos = ordered[-1]['pos']
+    
+    return ordered
+
+
+def job_gcode(
+              ops=[],
+              clearance=5.0,
+              change_z=30.0,
+              start_tool=None,
+              rpm={},
+              pause=False,
+              stats=None,
+             ):
+    '''Generate gcode for a job made from operations using several tools.
+Before each tool change the spindle is raised to change_z, and stopped if
+  this program started it.
+T and M6 words are written for controllers which handle tool changes, and
+  if pause is True an M0 waits for the tool to be changed and Z re-zeroed by
+  hand, as GRBL requires, then the new tool is raised to change_z.
+rpm is an optional dict of spindle speed by tool number, tools without a
+  speed are assumed to be run with the spindle controlled by hand.
+If stats is a dict it's filled with the number of tool changes, not counting
+  the first tool loaded into an empty spindle, and the length of rapid XY
+  travel between operations.
+Starts and finishes at X0 Y0, at clearance, in absolute (G90) mode.
+    '''
+    assert isinstance(ops, list)
+    assert isinstance(clearance, float) and clearance > 0.0
+    assert isinstance(change_z, float) and change_z >= clearance
+    assert isinstance(rpm, dict)
+    assert isinstance(pause, bool)
+    
+    g = []
+    
+    # Select XY plane, units as millimeters, absolute positioning.
+    g.append('G17')
+    g.append('G21')
+    g.append('G90')
+    g.append('G0 Z%s' % floatf(clearance))
+    
+    tool = start_tool
+    pos = (0.0, 0.0)
+    spindle = False
+    changes = 0
+    travel = 0.0
+    for op in job_order(ops, start_tool):
+        raised = False
+        if op['tool'] != tool:
+            if tool is not None:
+                changes += 1
+            tool = op['tool']
+            raised = True
+            if spindle:
+                g.append('M5')
+                spindle = False
+            g.append('G0 Z%s' % floatf(change_z))
+            g.append('T%d M6' % tool)
+            if pause:
+                g.append('M0 (Change to tool %d and zero Z)' % tool)
+                # Touching off leaves the tool on the stock.
+                g.append('G0 Z%s' % floatf(change_z))
+            if tool in rpm:
+                g.append('M3 S%s' % floatf(rpm[tool]))
+                spindle = True
+    
+        g.append('G0 X%s Y%s' % (floatf(op['pos'][0]), floatf(op['pos'][1])))
+        travel += distance_between_pts(pos, op['pos'])
+        pos = op['pos']
+        if raised:
+            g.append('G0 Z%s' % floatf(clearance))
+    
+        if op['z'] is not None:
+            g.append('G0 Z%s' % floatf(op['z']))
+    
+        # Absolute moves would go to the same place for every operation.
+        program = op['program']
+        moves = list(gcode_parse(program.split('\n')))
+        if any([m['motion'] is not None and m['distance'] == 'G90' and
+                ('X' in m['axes'] or 'Y' in m['axes']) for m in moves]):
+            program = '\n'.join(transform_moves(moves, affine_2d(list(op['pos']))))
+        g.append(program)
+        g.append('G90')
+        if op['z'] is not None:
+            g.append('G0 Z%s' % floatf(clearance))
+    
+    if spindle:
+        g.append('M5')
+    g.append('G0 X0 Y0')
+    travel += distance_between_pts(pos, (0.0, 0.0))
+    
+    if stats is not None:
+        stats['tool_changes'] = changes
+        stats['travel'] = travel
+    
+    return '\n'.join(g)
+
+
+if __name__ == '__main__':
+    import argparse
+    import sys
+    
+    parser = argparse.ArgumentParser()
+    
+    parser.add_argument('--op',
+                        action='append',
+                        default=[],
+                        nargs=4,
+                        metavar=('TOOL', 'X', 'Y', 'FILE'),
+                        help='run a program from a script such as cherrymx_hole.py at X,Y with tool number TOOL, may be repeated')
+    
+    parser.add_argument('--clearance',
+                        action='store',
+                        default=5.0,
+                        type=float,
+                        help='clearance (mm)')
+    
+    parser.add_argument('--change_z',
+                        action='store',
+                        default=30.0,
+                        type=float,
+                        help='height to change tools at (mm)')
+    
+    parser.add_argument('--start_tool',
+                        action='store',
+                        default=0,
+                        type=int,
+                        help='tool already in the spindle, 0 for none')
+    
+    parser.add_argument('--rpm',
+                        action='append',
+                        default=[],
+                        nargs=2,
+                        type=int,
+                        metavar=('TOOL', 'RPM'),
+                        help='spindle speed for a tool, may be repeated')
+    
+    parser.add_argument('--pause',
+                        action='store',
+                        default=1,
+                        type=int,
+                        choices=[0, 1],
+                        help='pause with M0 at each tool change')
+    
+    args = parser.parse_args()
+    
+    # Script outputs start with the spindle at Z0.
+    ops = []
+    for (tool, x, y, fname) in args.op:
+        with open(fname) as fd:
+            program = fd.read().strip()
+        ops.append(job_op(int(tool), (float(x), float(y)), program, 0.0, fname))
+    
+    stats = {}
+    print(job_gcode(
+                    ops,
+                    clearance=args.clearance,
+                    change_z=args.change_z,
+                    start_tool=args.start_tool if args.start_tool else None,
+                    rpm=dict([(t, float(r)) for (t, r) in args.rpm]),
+                    pause=bool(args.pause),
+                    stats=stats,
+                   ))
+    sys.stderr.write('tool changes: %d\ntravel: %s\n' % (stats['tool_changes'],
+                                                        floatf(stats['travel'])))
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# Rewrite a gcode program which mixes absolute (G90) and relative (G91) modes
+#   so that it uses only one of them, writing the result to STDOUT.
+# The bounding box and final position are reported on STDERR.
+
+from gcode_parse import *
+from math_base import *
+
+
+def arc_extents(start=(0.0, 0.0), end=(0.0, 0.0), center=(0.0, 0.0), direction='G2'):
+    '''Return the 2D points on an arc which bound it, including both ends.
+These are the ends plus wherever the arc crosses a horizontal or vertical
+  through its centre.
+Start equal to end is taken to be a full circle.
+    '''
+    assert direction in ['G2', 'G3']
+    
+    r = distance_between_pts(start, center)
+    a0 = atan2(start[1] - center[1], start[0] - center[0])
+    a1 = atan2(end[1] - center[1], end[0] - center[0])
+    
+    # Sweep is always measured CCW from a0 to a1.
+    if direction == 'G2':
+        (a0, a1) = (a1, a0)
+    sweep = (a1 - a0) % (2*pi)
+    if sweep == 0.0:
+        sweep = 2*pi
+    
+    pts = [start, end]
+    for q in range(4):
+        if (q*pi/2 - a0) % (2*pi) <= sweep:
+            pts.append((center[0] + r*cos(q*pi/2), center[1] + r*sin(q*pi/2)))
+    return pts
+
+
+def normalize_moves(moves=[], distance='G90', stats=None):
+    '''Generate lines of gcode for parsed moves, all in one distance mode.
+The first line selects the mode, then G90/G91 words are removed from the
+  program, and lines left empty by that are dropped.
+Absolute output uses the positions tracked by the parser, relative output
+  uses differences of fixed point positions so it stays exact.
+If stats is a dict it is updated with the bounding box of all motion as
+  'min' and 'max', and the final position as 'end'.
+    '''
+    assert distance in distance_modes
+    
+    if stats is None:
+        stats = {}
+    stats['min'] = None
+    stats['max'] = None
+    stats['end'] = (0.0, 0.0, 0.0)
+    
+    def extend(pts):
+        for p in pts:
+            if stats['min'] is None:
+                stats['min'] = p
+                stats['max'] = p
+            stats['min'] = tuple([min(a, b) for a, b in zip(stats['min'], p)])
+            stats['max'] = tuple([max(a, b) for a, b in zip(stats['max'], p)])
+    
+    yield distance
+    for move in moves:
+        words = [w for w in move['words'] if not (w[0] == 'G' and 'G' + w[1] in distance_modes)]
+        
+        if move['motion'] is None:
+            if len(words) == len(move['words']):
+                yield move['raw']
+            elif len(words) > 0:
+                yield gcode_format(dict(move, words=words))
+            continue
+        
+        axes = dict(move['axes'])
+        (start, end) = (move['start'], move['end'])
+        for i, a in enumerate('XYZ'):
+            if a not in axes:
+                continue
+            if distance == 'G90':
+                axes[a] = end[i]
+            else:
+                axes[a] = float(to_fixed(end[i]) - to_fixed(start[i])) / FIXED_SCALE
+        
+        if move['motion'] in ['G2', 'G3'] and move['plane'] == 'G17':
+            c = (start[0] + move['axes'].get('I', 0.0), start[1] + move['axes'].get('J', 0.0))
+            extend([p + (start[2],) for p in arc_extents(start[:2], end[:2], c, move['motion'])])
+        extend([start, end])
+        stats['end'] = end
+        
+        yield gcode_format(dict(move, words=words), axes)
+
+
+if __name__ == '__main__':
+    import argparse
+    import sys
+    
+    parser = argparse.ArgumentParser()
+    
+    parser.add_argument('input',
+                        nargs='?',
+                        default='-',
+                        help='gcode file to read, or - for STDIN')
+    
+    parser.add_argument('--distance',
+                        action='store',
+                        default='G90',
+                        choices=distance_modes,
+                        help='output distance mode, G90 absolute or G91 relative')
+    
+    parser.add_argument('--tolerance',
+                        action='store',
+                        default=0.0001,
+                        type=float,
+                        help='largest end position error to ignore (mm)')
+
+    args = parser.parse_args()
+    
+    fd = sys.stdin if args.input == '-' else open(args.input)
+    stats = {}
+    for line in normalize_moves(gcode_parse(fd), args.distance, stats):
+        sys.stdout.write(line + '\n')
+    
+    # Programs are expected to finish back above where they started.
+    out = []
+    if stats['min'] is not None:
+        out += ['min: X%s Y%s Z%s' % tuple([floatf(round(i, 4) + 0.0) for i in stats['min']])]
+        out += ['max: X%s Y%s Z%s' % tuple([floatf(round(i, 4) + 0.0) for i in stats['max']])]
+    out += ['end: X%s Y%s Z%s' % tuple([floatf(round(i, 4) + 0.0) for i in stats['end']])]
+    if any([abs(i) > args.tolerance for i in stats['end'][:2]]):
+        out += ['WARNING: program does not end at its starting XY']
+    sys.stderr.write('\n'.join(out) + '\n')
@@ -0,0 +1,174 @@
+# Functions for reading gcode back in.
+# Lines are parsed one at a time from any iterable, such as an open file, so
+#   programs of any size can be processed in constant memory.
+
+import re
+
+from gcode_base import *
+
+# Words are a letter followed by a number, comments are in () or after ;.
+re_word = re.compile(r'([A-Z])\s*([-+]?[0-9]*\.?[0-9]+)')
+re_comment = re.compile(r'\([^)]*\)|;.*')
+
+# Modal groups tracked by the parser.
+motion_modes = ['G0', 'G1', 'G2', 'G3']
+distance_modes = ['G90', 'G91']
+plane_modes = ['G17', 'G18', 'G19']
+unit_modes = ['G20', 'G21']
+
+# Non-modal commands whose axis words aren't a move in the current mode.
+nonmodal_codes = ['G4', 'G10', 'G28', 'G28.1', 'G30', 'G30.1', 'G53', 'G92', 'G92.1']
+
+# Axis words which carry coordinates.
+axis_letters = 'XYZIJK'
+
+
+def gcode_words(line=''):
+    '''Return the words in a line of gcode as a list of (letter, text) tuples.
+Comments are dropped, and G/M numbers are normalised so G01 becomes G1.
+    '''
+    assert isinstance(line, str)
+    
+    words = []
+    for (l, v) in re_word.findall(re_comment.sub(' ', line.upper())):
+        if l in 'GM':
+            v = str(int(v)) if v.isdigit() else floatf(float(v))
+        words.append((l, v))
+    return words
+
+
+def gcode_state(
+                motion='G0',
+                distance='G90',
+                plane='G17',
+                units='G21',
+                feed=None,
+                pos=(0.0, 0.0, 0.0),
+                home=(0.0, 0.0, 0.0),
+               ):
+    '''Return a new modal state for the parser.
+The position of the spindle before the first line is unknown to the parser,
+  so it is taken to be pos, and the positions G28 and G30 return to are
+  taken to be home until set by G28.1 and G30.1.
+    '''
+    assert motion in motion_modes
+    assert distance in distance_modes
+    assert plane in plane_modes
+    assert units in unit_modes
+    assert isinstance(pos, tuple) and len(pos) == 3
+    assert isinstance(home, tuple) and len(home) == 3
+    
+    return {
+            'motion': motion,
+            'distance': distance,
+            'plane': plane,
+            'units': units,
+            'feed': feed,
+            'pos': pos,
+            'home': {'G28': home, 'G30': home},
+           }
+
+
+def gcode_parse(lines=[], state=None):
+    '''Generate one dict per line of gcode, tracking modal state.
+Each dict has:
+  n - line number, counting from 1.
+  raw - line without the newline.
+  words - as returned by gcode_words().
+  motion - G0..G3 if the line moves the spindle, otherwise None.
+  distance, plane, units, feed - modal state after the line.
+  axes - dict of axis letter to float value for the words on the line.
+  start, end - absolute (X, Y, Z) before and after the line.
+State is updated in place, so a caller can see the final position.
+Lines with non-modal commands such as G92 or G53 are never moves, so they're
+  passed on unchanged, but the position is set by G92 and by G28 and G30,
+  which finish at their stored position. G53 and G10 leave it unchanged as
+  machine coordinates and offsets are unknown to the parser.
+    '''
+    if state is None:
+        state = gcode_state()
+    
+    for n, raw in enumerate(lines, 1):
+        raw = raw.rstrip('\r\n')
+        words = gcode_words(raw)
+        
+        axes = {}
+        nonmodal = None
+        for (l, v) in words:
+            if l == 'G':
+                g = 'G' + v
+                if g in nonmodal_codes:
+                    nonmodal = g
+                elif g in motion_modes:
+                    state['motion'] = g
+                elif g in distance_modes:
+                    state['distance'] = g
+                elif g in plane_modes:
+                    state['plane'] = g
+                elif g in unit_modes:
+                    state['units'] = g
+            elif l == 'F':
+                state['feed'] = float(v)
+            elif l in axis_letters:
+                axes[l] = float(v)
+        
+        start = state['pos']
+        motion = None
+        if nonmodal == 'G92':
+            # Offset so the current position has the given coordinates.
+            state['pos'] = tuple([axes.get(a, start[i]) for i, a in enumerate('XYZ')])
+        elif nonmodal in ['G28', 'G30']:
+            # Axes given go by way of them to the stored position, all axes
+            #   if none are given.
+            home = state['home'][nonmodal]
+            named = [a for a in 'XYZ' if a in axes] or list('XYZ')
+            state['pos'] = tuple([home[i] if a in named else start[i] for i, a in enumerate('XYZ')])
+        elif nonmodal in ['G28.1', 'G30.1']:
+            state['home'][nonmodal[:3]] = start
+        elif nonmodal is not None:
+            # G53 moves are in machine coordinates, G10 only sets offsets.
+            pass
+        elif 'X' in axes or 'Y' in axes or 'Z' in axes:
+            motion = state['motion']
+            if state['distance'] == 'G90':
+                end = tuple([axes.get(a, start[i]) for i, a in enumerate('XYZ')])
+            else:
+                end = tuple([start[i] + axes.get(a, 0.0) for i, a in enumerate('XYZ')])
+            state['pos'] = end
+        elif state['motion'] in ['G2', 'G3'] and ('I' in axes or 'J' in axes):
+            # Full circle back to the same point.
+            motion = state['motion']
+        
+        yield {
+               'n': n,
+               'raw': raw,
+               'words': words,
+               'motion': motion,
+               'distance': state['distance'],
+               'plane': state['plane'],
+               'units': state['units'],
+               'feed': state['feed'],
+               'axes': axes,
+               'start': start,
+               'end': state['pos'],
+              }
+
+
+def gcode_format(move={}, axes=None):
+    '''Return a line of gcode for a parsed move, with new axis values.
+Words other than axes keep their original text, with G and M words first,
+  then the axes in XYZIJK order, then everything else.
+    '''
+    if axes is None:
+        axes = move['axes']
+    
+    words = ['%s%s' % w for w in move['words'] if w[0] in 'GM']
+    for l in axis_letters:
+        if l in axes:
+            # Adding 0.0 turns -0.0 from a transform into plain 0.
+            words.append('%s%s' % (l, floatf(axes[l] + 0.0)))
+    words += ['%s%s' % w for w in move['words'] if w[0] not in 'GM' + axis_letters]
+    
+    # Keep comments so the output can still be followed.
+    comments = re_comment.findall(move['raw'])
+    return ' '.join(words + comments)
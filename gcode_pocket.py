@@ -0,0 +1,276 @@
+# Functions for clearing pockets.
+
+from gcode_base import *
+from math_base import *
+
+
+def pocket_rows(polys=[], stepover=0.0):
+    '''Return the spans of horizontal scanlines across a region.
+The region is the area inside an odd number of the given polygons, so the
+  first polygon is the outline and any others are islands.
+Rows are spaced evenly at no more than stepover, and the top and bottom of
+  the region are left for a contour pass.
+Each row is a list of (x0, x1, y) spans, sorted in X.
+    '''
+    assert isinstance(polys, list) and len(polys) > 0
+    assert isinstance(stepover, float) and stepover > 0.0
+    
+    ys = [p[1] for p in polys[0]]
+    y_min = min(ys)
+    y_max = max(ys)
+    n_rows = int(ceil((y_max - y_min) / stepover))
+    if n_rows < 2:
+        return []
+    h = (y_max - y_min) / n_rows
+    
+    rows = []
+    for k in range(1, n_rows):
+        y = y_min + k*h
+        xs = []
+        for poly in polys:
+            j = poly[-1]
+            for i in poly:
+                if (i[1] > y) != (j[1] > y):
+                    xs.append(i[0] + (y - i[1]) * (j[0] - i[0]) / (j[1] - i[1]))
+                j = i
+        xs.sort()
+        rows.append([(xs[i], xs[i+1], y) for i in range(0, len(xs) - 1, 2)])
+    
+    return rows
+
+
+def link_is_safe(a=(0.0, 0.0), b=(0.0, 0.0), polys=[]):
+    '''Return True if the tool can feed straight from a to b within a region.
+The region is described the same way as for pocket_rows(), and is where the
+  tool centre may go, such as from pocket_region(), which is already offset
+  by the endmill radius, so a safe link can't touch a wall or island.
+    '''
+    for poly in polys:
+        l_poly = len(poly)
+        for i in range(l_poly):
+            if segments_intersect(a, b, poly[i], poly[(i+1) % l_poly]):
+                return False
+    
+    # Links running along a wall are allowed.
+    mid = pt_between_pts(a, b)
+    for poly in polys:
+        l_poly = len(poly)
+        for i in range(l_poly):
+            if distance_pt_segment(mid, poly[i], poly[(i+1) % l_poly]) < 1e-9:
+                return True
+    return sum([int(pt_in_polygon(mid, poly)) for poly in polys]) % 2 == 1
+
+
+def zigzag_paths(polys=[], stepover=0.0):
+    '''Return zigzag paths covering the spans of a region.
+Spans on adjacent rows are chained together while the link between them
+  stays inside the region, so each path needs only one plunge.
+    '''
+    rows = pocket_rows(polys, stepover)
+    done = [[False for s in r] for r in rows]
+    
+    paths = []
+    for r0 in range(len(rows)):
+        for s0 in range(len(rows[r0])):
+            if done[r0][s0]:
+                continue
+            
+            # Start a new chain going left to right.
+            done[r0][s0] = True
+            (x0, x1, y) = rows[r0][s0]
+            path = [(x0, y), (x1, y)]
+            rightwards = True
+            r = r0
+            while r + 1 < len(rows):
+                end = path[-1]
+                nxt = None
+                for s, (t0, t1, ty) in enumerate(rows[r+1]):
+                    if done[r+1][s]:
+                        continue
+                    near = (t1, ty) if rightwards else (t0, ty)
+                    if link_is_safe(end, near, polys):
+                        nxt = s
+                        break
+                if nxt is None:
+                    break
+                r += 1
+                done[r][nxt] = True
+                (t0, t1, ty) = rows[r][nxt]
+                rightwards = not rightwards
+                if rightwards:
+                    path += [(t0, ty), (t1, ty)]
+                else:
+                    path += [(t1, ty), (t0, ty)]
+            paths.append(path)
+    
+    return paths
+
+
+def contour_rings(outline=[], islands=[], stepover=0.0):
+    '''Return successive inward offsets of an outline, outermost first.
+Outline must be CCW and islands CW, so that positive offsets shrink the
+  area left to cut.
+Offsetting stops when the ring would collapse or run into an island.
+    '''
+    rings = [outline]
+    while True:
+        ring = polygon_offset(rings[-1], stepover)
+        if ring is None or polygon_area(ring) <= 0.0:
+            break
+        if polygons_intersect(ring, ring):
+            break
+        if any([polygons_intersect(ring, i) for i in islands]):
+            break
+        if not all([pt_in_polygon(p, ring) for i in islands for p in i]):
+            break
+        rings.append(ring)
+    
+    return rings
+
+
+def pocket_region(pts=[], islands=[], endmill=0.0):
+    '''Return the region the tool centre may move in while clearing a pocket.
+The first polygon is the outline shrunk by the endmill radius and made CCW,
+  followed by each island grown by the endmill radius and made CW.
+    '''
+    assert isinstance(pts, list) and len(pts) > 2
+    assert isinstance(islands, list)
+    assert isinstance(endmill, float) and endmill > 0.0
+    
+    if polygon_area(pts) < 0.0:
+        pts = list(reversed(pts))
+    outline = polygon_offset(pts, endmill/2)
+    assert outline is not None, 'Pocket too small for endmill.'
+    
+    polys = [outline]
+    for i in islands:
+        if polygon_area(i) > 0.0:
+            i = list(reversed(i))
+        wall = polygon_offset(i, endmill/2)
+        assert wall is not None
+        polys.append(wall)
+    
+    return polys
+
+
+def pocket_paths(
+                 polys=[],
+                 stepover=0.0,
+                 endmill=0.0,
+                 strategy='contour',
+                 direction='ccw',
+                ):
+    '''Return the tool centre paths for clearing one layer of a pocket.
+Polys is the region the tool centre must stay in, from pocket_region().
+Paths are ordered so that linking moves are short and the final paths
+  trace the walls of the pocket.
+    '''
+    assert isinstance(polys, list) and len(polys) > 0
+    assert isinstance(stepover, float) and 0.0 < stepover < endmill
+    assert isinstance(strategy, str) and strategy in ['contour', 'zigzag']
+    assert isinstance(direction, str) and direction in ['cw', 'ccw']
+    
+    outline = polys[0]
+    walls = polys[1:]
+    
+    if strategy == 'contour':
+        rings = contour_rings(outline, walls, stepover)
+        core = [rings[-1]] + walls
+    else:
+        rings = [outline]
+        core = polys
+    
+    # Clear the core first, then work outwards through the rings.
+    paths = zigzag_paths(core, stepover)
+    for ring in reversed(rings):
+        paths.append(ring + [ring[0]])
+    for w in walls:
+        paths.append(w + [w[0]])
+    
+    if direction == 'cw':
+        paths = [list(reversed(p)) if p[0] == p[-1] else p for p in paths]
+    
+    return paths
+
+
+def pocket_polygon(
+                   pts=[],
+                   islands=[],
+                   depth=0.0,
+                   pitch=0.0,
+                   stepover=0.0,
+                   endmill=0.0,
+                   feedrate=0.0,
+                   plungerate=0.0,
+                   clearance=5.0,
+                   strategy='contour',
+                   direction='ccw',
+                  ):
+    '''Generate gcode to clear a polygonal pocket with optional islands.
+Points are relative to the current position.
+Assume spindle is at clearance and in relative (G91) mode.
+Returns spindle to clearance and starting XY.
+    '''
+    assert isinstance(depth, float) and depth > 0.0
+    assert isinstance(pitch, float) and pitch > 0.0
+    assert isinstance(feedrate, float) and feedrate > 0.0
+    assert isinstance(plungerate, float) and plungerate > 0.0
+    assert isinstance(clearance, float) and clearance > 0.0
+    
+    # Tool centre must stay inside the outline and outside the islands.
+    polys = pocket_region(pts, islands, endmill)
+    paths = pocket_paths(polys, stepover, endmill, strategy, direction)
+    
+    # Moves are differences between fixed point positions, so the spindle
+    #   returns exactly to where it started.
+    layers = [to_fixed(d) for d in depth_levels(depth_passes(depth, pitch))]
+    fpaths = [pts_to_fixed(path) for path in paths]
+    top = to_fixed(clearance)
+    
+    g = []
+    pos = (0, 0)
+    last = (0.0, 0.0)
+    z = top
+    floor = 0
+    for i, d in enumerate(layers):
+        g.append('(layer%d)' % i)
+        for path, fpath in zip(paths, fpaths):
+            # Stay down if the link keeps the tool within the pocket walls.
+            # It can still cut through material this layer hasn't reached
+            #   yet, at most a full slot, the same as the first pass.
+            if z < top and link_is_safe(last, path[0], polys):
+                g.append('G1 X%(x)s Y%(y)s F%(f)s' % {
+                                               'x': fixedf(fpath[0][0] - pos[0]),
+                                               'y': fixedf(fpath[0][1] - pos[1]),
+                                               'f': floatf(feedrate),
+                                              })
+            else:
+                if z < top:
+                    g.append('G0 Z%s' % fixedf(top - z))
+                    z = top
+                g.append('G0 X%(x)s Y%(y)s' % {
+                                               'x': fixedf(fpath[0][0] - pos[0]),
+                                               'y': fixedf(fpath[0][1] - pos[1]),
+                                              })
+                g.append('G0 Z%s' % fixedf(floor - z))
+                z = floor
+            if z > -d:
+                g.append('G1 Z%(z)s F%(f)s' % {
+                                               'z': fixedf(-d - z),
+                                               'f': floatf(plungerate),
+                                              })
+                z = -d
+            g.append(fixed_points_path(pts=vectors_along_pts(fpath),
+                                       feedrate=feedrate))
+            pos = fpath[-1]
+            last = path[-1]
+        floor = -d
+    
+    # Move back to start position.
+    g.append('G0 Z%s' % fixedf(top - z))
+    g.append('G0 X%(x)s Y%(y)s' % {
+                                   'x': fixedf(pos[0] * -1),
+                                   'y': fixedf(pos[1] * -1),
+                                  })
+    
+    return '\n'.join(g)
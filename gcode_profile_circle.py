@@ -13,8 +13,15 @@ def profile_circle_abs(
                        direction='cw',
                        roughing=0.0,
                        clearance=5.0,
+                       endmill=0.0,
+                       adaptive=False,
+                       min_pitch=0.0,
+                       finishing=0.0,
                       ):
     '''Generate gcode for a circle at an absolute position using a helix.
+If adaptive is True the feedrate of each pass is set for how much of the
+  endmill is engaged, see feed_factor().
+min_pitch and finishing set the depth passes, see depth_passes().
 Assume spindle is at clearance.
     '''
     assert isinstance(diameter, float) and diameter > 0.0
@@ -23,6 +30,8 @@ Assume spindle is at clearance.
     assert isinstance(feedrate, float) and feedrate > 0.0
     assert isinstance(direction, str) and direction in ['cw', 'ccw']
     assert isinstance(roughing, float) and roughing >= 0.0
+    assert isinstance(endmill, float) and endmill >= 0.0
+    assert isinstance(adaptive, bool) and (endmill > 0.0 or not adaptive)
     # +ve offset is always on RHS of movement, -ve on LHS.
     assert isinstance(offset, float)
     if direction == 'cw':
@@ -35,6 +44,12 @@ Assume spindle is at clearance.
     
     rough_radius = radius - roughing
     
+    # Roughing passes cut a full slot, the finishing pass only what's left.
+    (rough_feed, finish_feed) = (feedrate, feedrate*0.7)
+    if adaptive:
+        rough_feed = engagement_feedrate(feedrate, endmill, endmill/2, rough_radius)
+        finish_feed = engagement_feedrate(feedrate, roughing, endmill/2, radius)
+    
     g = []
     
     # Select XY plane.
@@ -45,35 +60,21 @@ Assume spindle is at clearance.
     g.append('G0 X%s Y%s' % start_pt)
     g.append('G0 Z0')
     
-    # First shallow loop for remainder.
-    # This loop will be less than the specified pitch.
-    remainder_pitch = depth % pitch
-    g.append('%(dir)s X%(x)s Y%(y)s Z%(z)s I0 J%(j)s F%(f)s' % {
-                                                'dir': g_dir,
-                                                'f': floatf(feedrate),
-                                                'x': floatf(start_pt[0]),
-                                                'y': floatf(start_pt[1]),
-                                                'z': floatf(remainder_pitch * -1),
-                                                'j': floatf(rough_radius * -1),
-                                               })
-    
-    # Main helix.
-    current_depth = remainder_pitch
-    for l in range(int(depth / pitch)):
+    # Main helix, one loop per pass.
+    for current_depth in depth_levels(depth_passes(depth, pitch, min_pitch, finishing)):
         g.append('%(dir)s X%(x)s Y%(y)s Z%(z)s I0 J%(j)s F%(f)s' % {
                                                     'dir': g_dir,
-                                                    'f': floatf(feedrate),
+                                                    'f': floatf(rough_feed),
                                                     'x': floatf(start_pt[0]),
                                                     'y': floatf(start_pt[1]),
-                                                    'z': floatf((current_depth+l) * -1),
+                                                    'z': floatf(current_depth * -1),
                                                     'j': floatf(rough_radius * -1),
                                                    })
-        current_depth += l
     
     # Even out the bottom.
     g.append('%(dir)s X%(x)s Y%(y)s Z%(z)s I0 J%(j)s F%(f)s' % {
                                                 'dir': g_dir,
-                                                'f': floatf(feedrate),
+                                                'f': floatf(rough_feed),
                                                 'x': floatf(start_pt[0]),
                                                 'y': floatf(start_pt[1]),
                                                 'z': floatf(current_depth * -1),
@@ -85,7 +86,7 @@ Assume spindle is at clearance.
         g.append('G0 Y%s' % floatf(center[1]*-1 + radius))
         g.append('%(dir)s X%(x)s Y%(y)s Z%(z)s I0 J%(j)s F%(f)s' % {
                                                     'dir': g_dir,
-                                                    'f': floatf(feedrate*0.7),
+                                                    'f': floatf(finish_feed),
                                                     'x': floatf(start_pt[0]),
                                                     'y': floatf(start_pt[1]),
                                                     'z': floatf(current_depth * -1),
@@ -106,8 +107,15 @@ def profile_circle_rel(
                        offset=0.0,
                        direction='cw',
                        roughing=0.0,
+                       endmill=0.0,
+                       adaptive=False,
+                       min_pitch=0.0,
+                       finishing=0.0,
                       ):
     '''Generate gcode for a circle at the current position using a helix.
+If adaptive is True the feedrate of each pass is set for how much of the
+  endmill is engaged, see feed_factor().
+min_pitch and finishing set the depth passes, see depth_passes().
     '''
     assert isinstance(diameter, float) and diameter > 0.0
     assert isinstance(depth, float) and depth > 0.0
@@ -115,6 +123,8 @@ def profile_circle_rel(
     assert isinstance(feedrate, float) and feedrate > 0.0
     assert isinstance(direction, str) and direction in ['cw', 'ccw']
     assert isinstance(roughing, float) and roughing >= 0.0
+    assert isinstance(endmill, float) and endmill >= 0.0
+    assert isinstance(adaptive, bool) and (endmill > 0.0 or not adaptive)
     # +ve offset is always on RHS of movement, -ve on LHS.
     assert isinstance(offset, float)
     if direction == 'cw':
@@ -125,6 +135,12 @@ def profile_circle_rel(
     
     rough_radius = radius - roughing
     
+    # Roughing passes cut a full slot, the finishing pass only what's left.
+    (rough_feed, finish_feed) = (feedrate, feedrate*0.7)
+    if adaptive:
+        rough_feed = engagement_feedrate(feedrate, endmill, endmill/2, rough_radius)
+        finish_feed = engagement_feedrate(feedrate, roughing, endmill/2, radius)
+    
     g = []
     
     # Select XY plane.
@@ -133,22 +149,17 @@ def profile_circle_rel(
     # Offset from centre of hole to start spiral
     g.append('G0 Y%s' % floatf(rough_radius * -1))
     
-    # First shallow loop for remainder.
-    # This loop will be less than the specified pitch.
-    remainder_pitch = depth % pitch
-    g.append(helix_path(rough_radius, remainder_pitch, feedrate, direction))
-    
-    # Main helix.
-    for l in range(int(depth / pitch)):
-        g.append(helix_path(rough_radius, pitch, feedrate, direction))
+    # Main helix, one loop per pass.
+    for c in depth_passes(depth, pitch, min_pitch, finishing):
+        g.append(helix_path(rough_radius, c, rough_feed, direction))
     
     # Even out the bottom.
-    g.append(helix_path(rough_radius, 0.0, feedrate, direction))
+    g.append(helix_path(rough_radius, 0.0, rough_feed, direction))
     
     # Fill radius with finishing pass.
     if roughing != 0.0:
         g.append('G0 Y%s' % floatf(roughing * -1))
-        g.append(helix_path(radius, 0.0, feedrate*0.7, direction))
+        g.append(helix_path(radius, 0.0, finish_feed, direction))
     
     # Go back to original position.
     g.append('G0 Z%s' % floatf(depth))
@@ -156,3 +167,230 @@ def profile_circle_rel(
     
     return '\n'.join(g)
 
+
+
+def spiral_clear_moves(
+                       radius=0.0,
+                       entry_radius=0.0,
+                       layers=[],
+                       stepover=0.0,
+                      ):
+    '''Return moves for clearing a circle by spiralling out from the centre.
+Each layer is entered by a helix at entry_radius, then a spiral of half arcs
+  grows the radius by stepover per turn up to radius, which is finished with
+  a full circle before feeding back in for the next layer.
+Moves are tuples of (kind, dx, dy, dz, j, woc) relative to the previous
+  point, where kind is 'arc', 'line' or 'rapid', j is the Y offset to the arc
+  centre, and woc is how much wider than the cut so far the move cuts, or
+  None for a full slot.
+The first move starts at the centre and the last move returns there.
+    '''
+    assert isinstance(radius, float) and radius > 0.0
+    assert isinstance(entry_radius, float) and 0.0 < entry_radius <= radius
+    assert isinstance(layers, list) and len(layers) > 0
+    assert isinstance(stepover, float) and stepover > 0.0
+    
+    # Spread the spiral evenly so the last turn lands exactly on radius.
+    n_turns = int(ceil((radius - entry_radius) / stepover))
+    if n_turns > 0:
+        s = (radius - entry_radius) / n_turns
+    
+    m = []
+    m.append(('rapid', 0.0, -entry_radius, 0.0, 0.0, 0.0))
+    for l in layers:
+        # Helical entry then level out at the bottom.
+        m.append(('arc', 0.0, 0.0, -l, entry_radius, None))
+        m.append(('arc', 0.0, 0.0, 0.0, entry_radius, None))
+        
+        # Half arcs alternate between -Y and +Y, each growing by s/2.
+        for k in range(2 * n_turns):
+            y0 = (-1)**(k+1) * (entry_radius + k*s/2)
+            y1 = (-1)**k * (entry_radius + (k+1)*s/2)
+            m.append(('arc', 0.0, y1 - y0, 0.0, (y0 + y1)/2 - y0, s))
+        
+        if n_turns > 0:
+            # Full circle to finish the wall, then back to the entry point.
+            # The spiral leaves at most half a turn's growth on the wall.
+            m.append(('arc', 0.0, 0.0, 0.0, radius, s/2))
+            m.append(('line', 0.0, radius - entry_radius, 0.0, 0.0, 0.0))
+    
+    m.append(('rapid', 0.0, 0.0, sum(layers), 0.0, 0.0))
+    m.append(('rapid', 0.0, entry_radius, 0.0, 0.0, 0.0))
+    
+    return m
+
+
+def clear_circle_rel(
+                     diameter=0.0,
+                     depth=0.0,
+                     pitch=0.0,
+                     stepover=0.0,
+                     feedrate=0.0,
+                     endmill=0.0,
+                     direction='cw',
+                     adaptive=False,
+                     min_pitch=0.0,
+                     finishing=0.0,
+                    ):
+    '''Generate gcode to clear a circle at the current position.
+If adaptive is True the feedrate of each arc is set for how much of the
+  endmill is engaged, see feed_factor().
+min_pitch and finishing set the depth passes, see depth_passes().
+Assume spindle is at Z0 and in relative (G91) mode.
+Returns spindle to starting position.
+    '''
+    assert isinstance(diameter, float) and diameter > 0.0
+    assert isinstance(depth, float) and depth > 0.0
+    assert isinstance(pitch, float) and pitch > 0.0
+    assert isinstance(stepover, float) and stepover > 0.0
+    assert isinstance(feedrate, float) and feedrate > 0.0
+    assert isinstance(endmill, float) and 0.0 < endmill < diameter
+    assert isinstance(direction, str) and direction in ['cw', 'ccw']
+    assert isinstance(adaptive, bool)
+    assert stepover < endmill
+    
+    if direction == 'cw':
+        g_dir = 'G2'
+    else:
+        g_dir = 'G3'
+    
+    radius = diameter/2 - endmill/2
+    entry_radius = min(stepover/2, radius)
+    
+    layers = depth_passes(depth, pitch, min_pitch, finishing)
+    
+    g = []
+    
+    # Select XY plane.
+    g.append('G17')
+    
+    # Moves are differences between fixed point positions, so the spindle
+    #   returns exactly to where it started.
+    pos = (0.0, 0.0, 0.0)
+    prev = (0, 0, 0)
+    for (kind, mx, my, mz, j, woc) in spiral_clear_moves(radius, entry_radius,
+                                                          layers, stepover):
+        pos = (pos[0] + mx, pos[1] + my, pos[2] + mz)
+        fpos = tuple([to_fixed(i) for i in pos])
+        (dx, dy, dz) = [fixedf(fpos[i] - prev[i]) for i in range(3)]
+        prev = fpos
+        if kind == 'arc':
+            f = feedrate
+            if adaptive:
+                f = engagement_feedrate(feedrate, endmill if woc is None else woc,
+                                        endmill/2, abs(j))
+            g.append('%(dir)s X%(x)s Y%(y)s Z%(z)s I0 J%(j)s F%(f)s' % {
+                                                        'dir': g_dir,
+                                                        'f': floatf(f),
+                                                        'x': dx,
+                                                        'y': dy,
+                                                        'z': dz,
+                                                        'j': floatf(j),
+                                                       })
+        elif kind == 'line':
+            g.append('G1 X%(x)s Y%(y)s F%(f)s' % {
+                                                  'f': floatf(feedrate),
+                                                  'x': dx,
+                                                  'y': dy,
+                                                 })
+        else:
+            g.append('G0 X%(x)s Y%(y)s Z%(z)s' % {
+                                                  'x': dx,
+                                                  'y': dy,
+                                                  'z': dz,
+                                                 })
+    
+    return '\n'.join(g)
+
+
+def clear_circle_abs(
+                     center=(0.0, 0.0),
+                     diameter=0.0,
+                     depth=0.0,
+                     pitch=0.0,
+                     stepover=0.0,
+                     feedrate=0.0,
+                     endmill=0.0,
+                     direction='cw',
+                     clearance=5.0,
+                     adaptive=False,
+                     min_pitch=0.0,
+                     finishing=0.0,
+                    ):
+    '''Generate gcode to clear a circle at an absolute position.
+If adaptive is True the feedrate of each arc is set for how much of the
+  endmill is engaged, see feed_factor().
+min_pitch and finishing set the depth passes, see depth_passes().
+Assume spindle is at clearance and in absolute (G90) mode.
+Returns spindle to clearance.
+    '''
+    assert isinstance(center, tuple) and len(center) == 2
+    assert isinstance(diameter, float) and diameter > 0.0
+    assert isinstance(depth, float) and depth > 0.0
+    assert isinstance(pitch, float) and pitch > 0.0
+    assert isinstance(stepover, float) and stepover > 0.0
+    assert isinstance(feedrate, float) and feedrate > 0.0
+    assert isinstance(endmill, float) and 0.0 < endmill < diameter
+    assert isinstance(direction, str) and direction in ['cw', 'ccw']
+    assert isinstance(clearance, float) and clearance > 0.0
+    assert isinstance(adaptive, bool)
+    assert stepover < endmill
+    
+    if direction == 'cw':
+        g_dir = 'G2'
+    else:
+        g_dir = 'G3'
+    
+    radius = diameter/2 - endmill/2
+    entry_radius = min(stepover/2, radius)
+    
+    layers = depth_passes(depth, pitch, min_pitch, finishing)
+    
+    g = []
+    
+    # Select XY plane.
+    g.append('G17')
+    
+    g.append('G0 X%(x)s Y%(y)s' % {
+                                   'x': floatf(center[0]),
+                                   'y': floatf(center[1]),
+                                  })
+    g.append('G0 Z0')
+    
+    # Accumulate relative moves into absolute positions.
+    (x, y, z) = (center[0], center[1], 0.0)
+    for (kind, dx, dy, dz, j, woc) in spiral_clear_moves(radius, entry_radius,
+                                                          layers, stepover):
+        (x, y, z) = (x + dx, y + dy, z + dz)
+        if kind == 'arc':
+            f = feedrate
+            if adaptive:
+                f = engagement_feedrate(feedrate, endmill if woc is None else woc,
+                                        endmill/2, abs(j))
+            g.append('%(dir)s X%(x)s Y%(y)s Z%(z)s I0 J%(j)s F%(f)s' % {
+                                                        'dir': g_dir,
+                                                        'f': floatf(f),
+                                                        'x': floatf(x),
+                                                        'y': floatf(y),
+                                                        'z': floatf(z),
+                                                        'j': floatf(j),
+                                                       })
+        elif kind == 'line':
+            g.append('G1 X%(x)s Y%(y)s F%(f)s' % {
+                                                  'f': floatf(feedrate),
+                                                  'x': floatf(x),
+                                                  'y': floatf(y),
+                                                 })
+        else:
+            if dz != 0.0:
+                g.append('G0 Z%s' % floatf(z))
+            if dx != 0.0 or dy != 0.0:
+                g.append('G0 X%(x)s Y%(y)s' % {
+                                               'x': floatf(x),
+                                               'y': floatf(y),
+                                              })
+    
+    # Go back to clearance.
+    g.append('G0 Z%s' % floatf(clearance))
+    
+    return '\n'.join(g)
@@ -4,6 +4,151 @@ from gcode_base import *
 from math_base import *
 
 
+def polygon_helix_center(pts=[], radius=0.0, inside=True):
+    '''Find space for a helix which fits inside a polygon, or outside it if
+  inside is False, so it's always on the waste side of the path.
+The helix is tangent to the middle of an edge, trying each edge in turn.
+Returns the index of the edge and the centre of the helix relative to the
+  middle of that edge, or None if no helix fits.
+    '''
+    assert isinstance(pts, list) and len(pts) > 2
+    assert isinstance(radius, float) and radius > 0.0
+    assert isinstance(inside, bool)
+    l_pts = len(pts)
+    
+    # Inside is on the LHS of travel for CCW polygons, RHS for CW.
+    side = 1.0 if polygon_area(pts) > 0.0 else -1.0
+    if not inside:
+        side = -side
+    
+    for k in range(l_pts):
+        a = pts[k]
+        b = pts[(k+1) % l_pts]
+        l = distance_between_pts(a, b)
+        if l < 2*radius:
+            continue
+        
+        n = (-(b[1] - a[1]) / l * side, (b[0] - a[0]) / l * side)
+        mid = pt_between_pts(a, b)
+        c = (mid[0] + n[0]*radius, mid[1] + n[1]*radius)
+        
+        if pt_in_polygon(c, pts) != inside:
+            continue
+        if all([distance_pt_segment(c, pts[i], pts[(i+1) % l_pts]) >= radius - 1e-9 \
+                for i in range(l_pts)]):
+            return (k, (n[0]*radius, n[1]*radius))
+    
+    return None
+
+
+def polygon_fillets(pts=[], tolerance=0.0, endmill=0.0, inside=True):
+    '''Return a fillet for each corner of a closed path, as a tuple of
+  (arc start, arc end, centre, G2 or G3), or None where the corner is sharp.
+The path is the centre of the endmill, cutting inside the polygon if inside
+  is True, otherwise outside.
+Corners turning away from the material are rounded within tolerance of the
+  corner, which rounds the corner of the cut by the same amount.
+Corners turning towards the material are rounded with the endmill radius,
+  so the endmill rolls round the corner of the material instead of
+  overshooting it, and the cut is unchanged.
+Fillets use at most half of each edge, so they never overlap.
+    '''
+    assert isinstance(pts, list) and len(pts) > 2
+    assert isinstance(tolerance, float) and tolerance >= 0.0
+    assert isinstance(endmill, float) and endmill >= 0.0
+    assert isinstance(inside, bool)
+    l_pts = len(pts)
+    
+    # Inside is on the LHS of travel for CCW polygons, RHS for CW.
+    area = polygon_area(pts)
+    
+    fillets = []
+    for i in range(l_pts):
+        (p, v, n) = (pts[i-1], pts[i], pts[(i+1) % l_pts])
+        (l1, l2) = (distance_between_pts(p, v), distance_between_pts(v, n))
+        if l1 == 0.0 or l2 == 0.0:
+            fillets.append(None)
+            continue
+        u1 = ((v[0] - p[0]) / l1, (v[1] - p[1]) / l1)
+        u2 = ((n[0] - v[0]) / l2, (n[1] - v[1]) / l2)
+        cross = u1[0]*u2[1] - u1[1]*u2[0]
+        turn = abs(atan2(cross, u1[0]*u2[0] + u1[1]*u2[1]))
+        
+        # Straight on or doubling back, nothing to round.
+        if turn < 1e-6 or turn > pi - 1e-6:
+            fillets.append(None)
+            continue
+        
+        if ((cross * area > 0.0) != inside):
+            radius = endmill / 2
+        else:
+            # Arc is 1/cos(turn/2) - 1 of its radius inside the corner.
+            radius = tolerance / (1.0 / cos(turn/2) - 1.0)
+        radius = min(radius, min(l1, l2) / 2 / tan(turn/2))
+        d = radius * tan(turn/2)
+        if d < 1.0 / FIXED_SCALE:
+            fillets.append(None)
+            continue
+        
+        side = 1.0 if cross > 0.0 else -1.0
+        a = (v[0] - u1[0]*d, v[1] - u1[1]*d)
+        b = (v[0] + u2[0]*d, v[1] + u2[1]*d)
+        c = (a[0] - u1[1]*radius*side, a[1] + u1[0]*radius*side)
+        fillets.append((a, b, c, 'G3' if cross > 0.0 else 'G2'))
+    
+    return fillets
+
+
+def fixed_fillet_path(fpts=[], fillets=[], start=(0, 0), k=0, feedrate=0.0,
+                      endmill=0.0):
+    '''Generate gcode to go once round a closed path of fixed point points
+  with fillets from polygon_fillets(), starting and finishing at start, a
+  fixed point point on the edge from point k.
+Same as fixed_points_path(), moves are differences of fixed point positions
+  so the loop closes exactly.
+If endmill is more than 0, fillets are fed at the rate for a slot round them,
+  see feed_factor(), as the outside edge moves faster than the centre.
+Assume in relative (G91) mode.
+    '''
+    assert isinstance(fpts, list) and len(fpts) == len(fillets)
+    assert isinstance(feedrate, float) and feedrate > 0.0
+    assert isinstance(endmill, float) and endmill >= 0.0
+    l_pts = len(fpts)
+    
+    g = ['F%s' % floatf(feedrate)]
+    cur = start
+    
+    # Feedrate to put back on the next line after a slower fillet.
+    restore = ''
+    for j in range(1, l_pts + 1):
+        i = (k + j) % l_pts
+        if fillets[i] is None:
+            (a, b, c, g_dir) = (fpts[i], None, None, None)
+        else:
+            (a, b, c) = pts_to_fixed(list(fillets[i][:3]))
+            g_dir = fillets[i][3]
+        
+        if a != cur:
+            g.append('G1 X%s Y%s%s' % (fixedf(a[0] - cur[0]), fixedf(a[1] - cur[1]), restore))
+            cur = a
+            restore = ''
+        if b is not None:
+            f = ''
+            if endmill > 0.0:
+                r = distance_between_pts(fillets[i][0], fillets[i][2])
+                f = ' F%s' % floatf(engagement_feedrate(feedrate, endmill, endmill/2, r))
+                restore = ' F%s' % floatf(feedrate)
+            g.append('%s X%s Y%s I%s J%s%s' % (g_dir,
+                                               fixedf(b[0] - cur[0]), fixedf(b[1] - cur[1]),
+                                               fixedf(c[0] - cur[0]), fixedf(c[1] - cur[1]), f))
+            cur = b
+    
+    if cur != start:
+        g.append('G1 X%s Y%s%s' % (fixedf(start[0] - cur[0]), fixedf(start[1] - cur[1]), restore))
+    
+    return '\n'.join(g)
+
+
 def polygon_profile(
                     pts=[],
                     depth=0.0,
@@ -12,8 +157,26 @@ def polygon_profile(
                     plungerate=0.0,
                     clearance=0.0,
                     ablpd=True,
+                    entry='plunge',
+                    ramp_angle=radians(3.0),
+                    helix_radius=1.0,
+                    fillet=0.0,
+                    endmill=0.0,
+                    inside=True,
+                    adaptive=False,
+                    min_pitch=0.0,
+                    finishing=0.0,
                    ):
     '''Generate gcode for a polygon composed of straight lines between given points.
+Each pass is entered by plunging, ramping along the path, or by a helix
+  on the waste side if there is space for one (otherwise it ramps), which
+  is inside the polygon unless inside is False.
+If fillet is more than 0 corners are rounded within that tolerance, see
+  polygon_fillets(), so the machine doesn't have to stop at each one.
+Every pass cuts a full slot, so if adaptive is True only the fillets need a
+  different feedrate, see fixed_fillet_path(), and sharp corners have none
+  to adjust, so adaptive needs fillet more than 0.
+min_pitch and finishing set the depth passes, see depth_passes().
     '''
 
     assert isinstance(pts, list) and len(pts) > 0
@@ -21,20 +184,51 @@ def polygon_profile(
     assert isinstance(pitch, float) and pitch > 0.0
     assert isinstance(feedrate, float) and feedrate > 0.0
     assert isinstance(plungerate, float) and plungerate > 0.0
+    assert isinstance(entry, str) and entry in ['plunge', 'ramp', 'helix']
+    assert isinstance(ramp_angle, float) and 0.0 < ramp_angle < pi/2
+    assert isinstance(helix_radius, float) and helix_radius > 0.0
+    assert isinstance(fillet, float) and fillet >= 0.0
+    assert isinstance(adaptive, bool) and (endmill > 0.0 and fillet > 0.0 or not adaptive)
     
-    # Use points to calculate the relative movements.
-    rels = vectors_between_pts(pts)
+    # Use fixed point positions to calculate the relative movements, so every
+    #   pass closes exactly.
+    fpts = pts_to_fixed(pts)
+    rels = fixed_vectors_between_pts(fpts)
     
     # Build list of cut depths.
-    cuts = [(depth % pitch)] + [pitch for l in range(int(depth / pitch))]
+    cuts = fixed_steps(depth_passes(depth, pitch, min_pitch, finishing))
+    
+    # Helix is tangent to the middle of an edge, so start cutting there.
+    k = 0
+    start = (0, 0)
+    if entry == 'helix':
+        helix = polygon_helix_center(pts, helix_radius, inside)
+        if helix is None:
+            entry = 'ramp'
+        else:
+            (k, helix_center) = helix
+            half = (rels[k][0]//2, rels[k][1]//2)
+            rest = (rels[k][0] - half[0], rels[k][1] - half[1])
+            start = (fpts[k][0] - fpts[0][0] + half[0], fpts[k][1] - fpts[0][1] + half[1])
+            rels = [rest] + rels[k+1:] + rels[:k] + [half]
+            helix_dir = 'ccw' if (polygon_area(pts) > 0.0) == inside else 'cw'
+    
+    # The first corner is rounded off, so start where its fillet ends.
+    # Ramps still follow the sharp path, which never cuts any further.
+    if fillet > 0.0:
+        fillets = polygon_fillets(pts, fillet, endmill, inside)
+        if start == (0, 0) and fillets[0] is not None:
+            s = pts_to_fixed([fillets[0][1]])[0]
+            start = (s[0] - fpts[0][0], s[1] - fpts[0][1])
+            rels = [(fpts[1][0] - s[0], fpts[1][1] - s[1])] + rels[1:] + [start]
     
     g = []
     
     # Assume spindle is at clearance and zeroXY.
     # Move to start XY.
     g.append('G0 X%(x)s Y%(y)s' % {
-                                   'x': floatf(pts[0][0]),
-                                   'y': floatf(pts[0][1]),
+                                   'x': fixedf(fpts[0][0]),
+                                   'y': fixedf(fpts[0][1]),
                                   })
     
     # Anti-BackLash Point Drill
@@ -45,23 +239,43 @@ def polygon_profile(
                               plungerate=plungerate,
                               clearance=clearance))
     
+    # Move to where the cut starts.
+    if start != (0, 0):
+        g.append('G0 X%(x)s Y%(y)s' % {
+                                       'x': fixedf(start[0]),
+                                       'y': fixedf(start[1]),
+                                      })
+    
     # Move down to Z0 at start XY
     g.append('G0 Z-%s' % floatf(clearance))
     
     # For each cut pass generate the relative gcode.
     for i, c in enumerate(cuts):
         g.append('(cut%d)' % i)
-        g.append('G1 Z%(z)s F%(f)s' % {
-                                       'z': floatf(c * -1),
-                                       'f':floatf(plungerate),
-                                      })
-        g.append(points_path(pts=rels, feedrate=feedrate))
+        if entry == 'ramp':
+            g.append(ramp_path([(float(p[0]) / FIXED_SCALE,
+                                 float(p[1]) / FIXED_SCALE) for p in rels],
+                               float(c) / FIXED_SCALE, ramp_angle, feedrate))
+        elif entry == 'helix':
+            g.append(helix_entry_path(helix_center, float(c) / FIXED_SCALE,
+                                      ramp_angle, feedrate, helix_dir))
+        else:
+            g.append('G1 Z%(z)s F%(f)s' % {
+                                           'z': fixedf(c * -1),
+                                           'f':floatf(plungerate),
+                                          })
+        if fillet > 0.0:
+            g.append(fixed_fillet_path(fpts, fillets,
+                                       (fpts[0][0] + start[0], fpts[0][1] + start[1]),
+                                       k, feedrate, endmill if adaptive else 0.0))
+        else:
+            g.append(fixed_points_path(pts=rels, feedrate=feedrate))
     
     # Move back to start position
-    g.append('G0 Z%s' % floatf(clearance + depth))
+    g.append('G0 Z%s' % fixedf(to_fixed(clearance) + sum(cuts)))
     g.append('G0 X%(x)s Y%(y)s' % {
-                                   'x': floatf(pts[0][0] * -1),
-                                   'y': floatf(pts[0][1] * -1),
+                                   'x': fixedf((fpts[0][0] + start[0]) * -1),
+                                   'y': fixedf((fpts[0][1] + start[1]) * -1),
                                   })
     
     return '\n'.join(g)
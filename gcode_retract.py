@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+# Lower the rapid moves between cuts to the smallest safe height.
+# Generators retract to a fixed clearance between features so they can be
+#   called anywhere, but the spindle only needs to clear the top of the stock,
+#   and any fixtures such as clamps which are passed over on the way.
+# A hop is a run of rapids which starts and finishes at or below the safe
+#   height and goes above it in between. Each hop is lowered to the safe
+#   height, or to just above the tallest fixture it crosses, but never raised.
+# Rapids at the end of a program are left alone so the spindle still parks
+#   at full clearance, as are hops with any other line in them, such as a
+#   tool change or spindle stop, which must still happen at full height.
+
+from gcode_normalize import *
+
+
+def segment_crosses_rect(a=(0.0, 0.0), b=(0.0, 0.0), rect=(0.0, 0.0, 0.0, 0.0)):
+    '''Return True if the segment from a to b touches the rectangle given as
+  (x0, y0, x1, y1), by clipping the segment to it (Liang-Barsky).
+    '''
+    (t0, t1) = (0.0, 1.0)
+    (dx, dy) = (b[0] - a[0], b[1] - a[1])
+    for (p, q) in [(-dx, a[0] - rect[0]), (dx, rect[2] - a[0]),
+                   (-dy, a[1] - rect[1]), (dy, rect[3] - a[1])]:
+        if p == 0.0:
+            if q < 0.0:
+                return False
+        elif p < 0.0:
+            t0 = max(t0, q / p)
+        else:
+            t1 = min(t1, q / p)
+    return t0 <= t1
+
+
+def hop_height(hop=[], safe_z=1.0, fixtures=[], margin=1.0):
+    '''Return the lowest height the XY travel of a hop can be made at.
+    '''
+    h = safe_z
+    for move in hop:
+        if move['motion'] is None:
+            continue
+        (a, b) = (move['start'][:2], move['end'][:2])
+        for (rect, top) in fixtures:
+            if top + margin > h and segment_crosses_rect(a, b, rect):
+                h = top + margin
+    return h
+
+
+def plan_retracts(moves=[], stock_top=0.0, margin=1.0, fixtures=[], stats=None):
+    '''Generate lines of gcode for parsed absolute (G90) moves, with each hop
+  lowered to stock_top + margin, or the fixture height + margin where the
+  travel crosses a fixture.
+Fixtures are a list of ((x0, y0, x1, y1), top) tuples.
+If stats is a dict it's updated with the number of hops lowered and the Z
+  travel before and after.
+    '''
+    assert isinstance(stock_top, float)
+    assert isinstance(margin, float) and margin > 0.0
+    assert isinstance(fixtures, list)
+    
+    safe_z = stock_top + margin
+    if stats is None:
+        stats = {}
+    stats['hops'] = 0
+    stats['z_before'] = 0.0
+    stats['z_after'] = 0.0
+    
+    def flush(buf, h=None):
+        # Yield buffered lines, with rapids above h lowered to it.
+        for move in buf:
+            if move['motion'] is None:
+                yield move['raw']
+                continue
+            (z0, z1) = (move['start'][2], move['end'][2])
+            stats['z_before'] += abs(z1 - z0)
+            if h is None:
+                stats['z_after'] += abs(z1 - z0)
+                yield move['raw']
+                continue
+            (n0, n1) = (min(z0, h), min(z1, h))
+            stats['z_after'] += abs(n1 - n0)
+            if n1 == n0 and move['start'][:2] == move['end'][:2]:
+                # Nothing left of a purely vertical rapid.
+                continue
+            axes = dict(move['axes'])
+            if 'Z' in axes or n1 != z1:
+                axes['Z'] = n1
+            yield gcode_format(move, axes)
+    
+    hop = None
+    keep = False
+    for move in moves:
+        if move['distance'] != 'G90' and move['motion'] is not None:
+            assert False, 'Line %d: program must be absolute, see gcode_normalize.py' % move['n']
+    
+        if hop is None:
+            if move['motion'] == 'G0' and move['start'][2] <= safe_z < move['end'][2]:
+                hop = [move]
+                keep = False
+            else:
+                for line in flush([move]):
+                    yield line
+            continue
+    
+        hop.append(move)
+        if move['motion'] is None:
+            # Only comments and lines which just set modes, such as G21 at
+            #   the start of each feature, can be passed over lower down.
+            if any([not (w[0] == 'G' and 'G' + w[1] in plane_modes + unit_modes + distance_modes) \
+                    for w in move['words']]):
+                keep = True
+            continue
+        if move['motion'] != 'G0':
+            # Cutting above the safe height, so it isn't a hop.
+            for line in flush(hop):
+                yield line
+            hop = None
+        elif move['end'][2] <= safe_z:
+            if keep:
+                for line in flush(hop):
+                    yield line
+            else:
+                stats['hops'] += 1
+                for line in flush(hop, hop_height(hop, safe_z, fixtures, margin)):
+                    yield line
+            hop = None
+    
+    # A hop which never comes back down is the final park.
+    if hop is not None:
+        for line in flush(hop):
+            yield line
+
+
+if __name__ == '__main__':
+    import argparse
+    import sys
+    
+    parser = argparse.ArgumentParser()
+    
+    parser.add_argument('input',
+                        nargs='?',
+                        default='-',
+                        help='gcode file to read, or - for STDIN')
+    
+    parser.add_argument('--stock_top',
+                        action='store',
+                        default=0.0,
+                        type=float,
+                        help='Z of the top of the stock (mm)')
+    
+    parser.add_argument('--margin',
+                        action='store',
+                        default=1.0,
+                        type=float,
+                        help='height to clear stock and fixtures by (mm)')
+    
+    parser.add_argument('--fixture',
+                        action='append',
+                        default=[],
+                        nargs=5,
+                        type=float,
+                        metavar=('X0', 'Y0', 'X1', 'Y1', 'TOP'),
+                        help='rectangle which must be cleared, may be repeated')
+    
+    args = parser.parse_args()
+    
+    fixtures = [((min(f[0], f[2]), min(f[1], f[3]), max(f[0], f[2]), max(f[1], f[3])), f[4])
+                for f in args.fixture]
+    
+    # Make the program absolute first, as hops are found by height.
+    fd = sys.stdin if args.input == '-' else open(args.input)
+    moves = gcode_parse(normalize_moves(gcode_parse(fd), 'G90'))
+    stats = {}
+    for line in plan_retracts(moves, args.stock_top, args.margin, fixtures, stats):
+        sys.stdout.write(line + '\n')
+    sys.stderr.write('hops lowered: %d\nZ travel: %s before, %s after\n' % (
+                     stats['hops'], floatf(stats['z_before']),
+                     floatf(stats['z_after'])))
@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+# Long running server which generates gcode on request over a unix socket.
+# Starting python and importing the generators takes much longer than
+#   generating a single hole, so front ends which would otherwise run a script
+#   per request can keep one server running instead.
+# Requests and responses are single lines of JSON:
+#   {"generator": "cherrymx_hole", "argv": ["--width", "14.0"]}
+#   {"gcode": "G17\nG21\n..."} or {"error": "..."}
+# argv is the same as the command line arguments of the script.
+# Requests are served concurrently by a pool of worker processes, and each
+#   worker remembers recent results.
+
+import asyncio
+import contextlib
+import functools
+import io
+import json
+import os
+import signal
+import socket
+
+from cherrymx_hole import *
+from cherrymx_keystem import *
+from helical_hole import *
+from mcdox import *
+
+
+def mcdox_swmnt_argv(argv=[]):
+    '''Return gcode for a mcdox switch mount, LHS or RHS.
+    '''
+    import argparse
+    
+    parser = argparse.ArgumentParser(prog='mcdox_swmnt')
+    
+    parser.add_argument('--spc',
+                        action='store',
+                        default=19.0,
+                        type=float,
+                        help='spacing between centers of switches (mm)')
+    
+    parser.add_argument('--side',
+                        action='store',
+                        default='lhs',
+                        choices=['lhs', 'rhs'],
+                        help='which hand')
+    
+    parser.add_argument('--material',
+                        action='store',
+                        default='',
+                        choices=[''] + sorted(material_library.keys()),
+                        help='calculate feeds for this material')
+    
+    args = parser.parse_args(argv)
+    
+    g = mcdox_swmnt_gcode(mcdox_layout(args.spc), material=args.material)
+    return mcdox_mirror(g) if args.side == 'rhs' else g
+
+
+# Functions taking argv and returning gcode, by request name.
+generators = {
+              'cherrymx_hole': cherrymx_hole_gcode,
+              'cherrymx_keystem': cherrymx_keystem_gcode,
+              'helical_hole': helical_hole_gcode,
+              'mcdox_swmnt': mcdox_swmnt_argv,
+             }
+
+
+@functools.lru_cache(maxsize=256)
+def generate(name='', argv=()):
+    '''Return response dict for one request, run in a worker process.
+Messages argparse would print are returned as the error instead, as are
+  exceptions, so one bad request can't take down the worker.
+    '''
+    if name not in generators:
+        return {'error': 'Unknown generator %s' % name}
+    
+    err = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(err), contextlib.redirect_stderr(err):
+            return {'gcode': generators[name](list(argv))}
+    except SystemExit:
+        return {'error': err.getvalue().strip()}
+    except AssertionError:
+        return {'error': 'Invalid parameters for %s' % name}
+    except Exception as e:
+        return {'error': 'Failed %s: %s %s' % (name, type(e).__name__, str(e))}
+
+
+async def serve_client(reader=None, writer=None, pool=None):
+    '''Answer requests from one connection until it's closed.
+Any failure is answered with an error, keeping the connection open.
+    '''
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            line = await reader.readline()
+            if not len(line):
+                break
+    
+            try:
+                req = json.loads(line)
+                argv = tuple([str(a) for a in req.get('argv', [])])
+                resp = await loop.run_in_executor(pool, generate,
+                                                  req['generator'], argv)
+            except (ValueError, KeyError, TypeError) as e:
+                resp = {'error': 'Bad request %s' % str(e)}
+            except Exception as e:
+                # Such as a worker process dying.
+                resp = {'error': 'Failed request %s %s' % (type(e).__name__, str(e))}
+    
+            writer.write((json.dumps(resp) + '\n').encode())
+            await writer.drain()
+    finally:
+        writer.close()
+
+
+async def serve(path='', workers=None):
+    '''Serve requests on a unix socket at path until cancelled.
+    '''
+    from concurrent.futures import ProcessPoolExecutor
+    
+    # Stop cleanly when killed so the socket is removed.
+    loop = asyncio.get_running_loop()
+    loop.add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    
+    if os.path.exists(path):
+        os.remove(path)
+    
+    with ProcessPoolExecutor(workers) as pool:
+        server = await asyncio.start_unix_server(
+                        functools.partial(serve_client, pool=pool), path)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            os.remove(path)
+
+
+def gcode_request(path='', name='', argv=[]):
+    '''Return gcode from a running server, raising ValueError on error.
+    '''
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.connect(path)
+        s.sendall((json.dumps({'generator': name, 'argv': argv}) + '\n').encode())
+        with s.makefile('rb') as fd:
+            resp = json.loads(fd.readline())
+    
+    if 'error' in resp:
+        raise ValueError(resp['error'])
+    return resp['gcode']
+
+
+if __name__ == '__main__':
+    import argparse
+    import sys
+    
+    parser = argparse.ArgumentParser()
+    
+    parser.add_argument('--socket',
+                        action='store',
+                        default='/tmp/cncutils.sock',
+                        help='path of unix socket')
+    
+    parser.add_argument('--workers',
+                        action='store',
+                        default=os.cpu_count(),
+                        type=int,
+                        help='number of worker processes')
+    
+    parser.add_argument('--request',
+                        action='store',
+                        default='',
+                        choices=[''] + sorted(generators.keys()),
+                        help='send one request to a running server, passing on the remaining arguments')
+    
+    (args, argv) = parser.parse_known_args()
+    
+    if len(args.request):
+        try:
+            print(gcode_request(args.socket, args.request, argv))
+        except ValueError as e:
+            sys.exit(str(e))
+    else:
+        try:
+            asyncio.run(serve(args.socket, args.workers))
+        except (KeyboardInterrupt, asyncio.CancelledError):
+            pass
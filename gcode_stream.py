@@ -0,0 +1,484 @@
+#!/usr/bin/env python
+# Stream gcode to a GRBL controller over a serial port.
+# Character counting flow control keeps as many lines in GRBL's receive buffer
+#   as will fit, rather than waiting for each ok, so the planner never starves
+#   on short dense moves.
+# Status reports are polled with the ? realtime command, and streaming can be
+#   paused and resumed with feed hold (!) and cycle start (~).
+# On an error or alarm streaming stops with a feed hold, as the lines after it
+#   would run from the wrong place, unless asked to carry on regardless.
+# A simulated GRBL on a pty allows throughput to be measured without a machine.
+
+import asyncio
+import collections
+import os
+import re
+import termios
+import tty
+
+from gcode_parse import re_comment
+
+# Status reports look like <Run|MPos:0.000,0.000,0.000|Bf:15,128|FS:500,0>.
+re_status = re.compile(r'<([^>]*)>')
+
+
+def open_port(port='', baud=115200):
+    '''Return a non-blocking file descriptor for a serial port in raw mode.
+    '''
+    assert isinstance(port, str) and len(port) > 0
+    assert isinstance(baud, int)
+    
+    fd = os.open(port, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+    tty.setraw(fd)
+    
+    speed = getattr(termios, 'B%d' % baud)
+    attrs = termios.tcgetattr(fd)
+    (attrs[4], attrs[5]) = (speed, speed)
+    termios.tcsetattr(fd, termios.TCSANOW, attrs)
+    
+    return fd
+
+
+def stream_lines_clean(lines=[]):
+    '''Generate lines stripped of comments and whitespace, skipping blanks.
+Everything sent takes space in the controller's receive buffer.
+    '''
+    for line in lines:
+        line = re_comment.sub('', line).strip()
+        if len(line):
+            yield line
+
+
+def parse_status(report=''):
+    '''Return dict of fields in a GRBL status report, without the <>.
+    '''
+    fields = report.split('|')
+    status = {'state': fields[0]}
+    for f in fields[1:]:
+        (k, _, v) = f.partition(':')
+        try:
+            status[k] = tuple([float(i) for i in v.split(',')])
+        except ValueError:
+            status[k] = v
+    return status
+
+
+def stream_state(rx_size=128, flow='count'):
+    '''Return a new state for streaming to one controller.
+Flow is 'count' for character counting, or 'ok' to send one line at a time
+  and wait for its ok, as simple senders do.
+    '''
+    assert isinstance(rx_size, int) and rx_size > 0
+    assert flow in ['count', 'ok']
+    
+    return {
+            'rx_size': rx_size,
+            'flow': flow,
+            'pending': collections.deque(), # Lengths of unacknowledged lines.
+            'queued': 0,                    # Bytes in controller's buffer.
+            'sent': 0,
+            'acked': 0,
+            'errors': [],
+            'messages': [],                 # Feedback such as probe results.
+            'status': {},
+            'paused': False,
+            'stopped': False,
+            'buf': b'',
+            'changed': None,
+           }
+
+
+async def write_all(fd=None, data=b''):
+    '''Write all of data to a non-blocking file descriptor.
+    '''
+    while len(data):
+        try:
+            n = os.write(fd, data)
+        except BlockingIOError:
+            n = 0
+        data = data[n:]
+        if len(data):
+            await asyncio.sleep(0.001)
+
+
+def stream_reader(fd=None, state={}, changed=None):
+    '''Return a callback for loop.add_reader() which handles responses from
+  the controller, setting the changed event whenever one arrives.
+    '''
+    def readable():
+        try:
+            state['buf'] += os.read(fd, 4096)
+        except BlockingIOError:
+            return
+    
+        *lines, state['buf'] = state['buf'].split(b'\n')
+        for line in lines:
+            line = line.decode(errors='replace').strip()
+            if line == 'ok' or line.startswith('error'):
+                # Responses arrive in the same order lines were sent.
+                if len(state['pending']):
+                    state['queued'] -= state['pending'].popleft()
+                state['acked'] += 1
+                if line != 'ok':
+                    state['errors'].append((state['acked'], line))
+            elif line.startswith('ALARM'):
+                state['errors'].append((state['acked'], line))
+            elif line.startswith('['):
+                state['messages'].append(line)
+            else:
+                m = re_status.match(line)
+                if m:
+                    state['status'] = parse_status(m.group(1))
+        changed.set()
+    
+    return readable
+
+
+async def stream_pause(fd=None, state={}):
+    '''Pause streaming and motion with a feed hold.
+    '''
+    state['paused'] = True
+    await write_all(fd, b'!')
+
+
+async def stream_resume(fd=None, state={}):
+    '''Resume motion with a cycle start, then streaming.
+    '''
+    await write_all(fd, b'~')
+    state['paused'] = False
+    if state['changed'] is not None:
+        state['changed'].set()
+
+
+async def status_poll(fd=None, interval=0.25):
+    '''Request a status report every interval seconds, until cancelled.
+Realtime commands don't use space in the receive buffer.
+    '''
+    while True:
+        await write_all(fd, b'?')
+        await asyncio.sleep(interval)
+
+
+async def stream_stop(fd=None, state={}, timeout=1.0):
+    '''Stop streaming with a feed hold, then wait for the lines already in the
+  controller's receive buffer to be acknowledged, until none arrive for
+  timeout seconds, as a full planner holds the rest back.
+    '''
+    state['stopped'] = True
+    await stream_pause(fd, state)
+    
+    # Status reports also set changed, so only acknowledgements extend the wait.
+    loop = asyncio.get_running_loop()
+    changed = state['changed']
+    acked = state['acked']
+    deadline = loop.time() + timeout
+    while len(state['pending']) and loop.time() < deadline:
+        changed.clear()
+        try:
+            await asyncio.wait_for(changed.wait(), deadline - loop.time())
+        except asyncio.TimeoutError:
+            break
+        if state['acked'] != acked:
+            acked = state['acked']
+            deadline = loop.time() + timeout
+
+
+async def stream(fd=None, lines=[], state=None, status_interval=0.25,
+                 on_status=None, continue_on_error=False):
+    '''Send lines to a controller, returning the state when every line has
+  been acknowledged.
+If on_status is given it's called with the state after every response.
+Unless continue_on_error, the first error or alarm stops streaming with
+  stream_stop(), leaving state['stopped'] set.
+    '''
+    if state is None:
+        state = stream_state()
+    
+    loop = asyncio.get_running_loop()
+    changed = state['changed'] = asyncio.Event()
+    loop.add_reader(fd, stream_reader(fd, state, changed))
+    poll = None
+    if status_interval > 0.0:
+        poll = asyncio.ensure_future(status_poll(fd, status_interval))
+    
+    # Simple senders behave as if the buffer only holds one line.
+    window = state['rx_size'] if state['flow'] == 'count' else 1
+    
+    def failed():
+        return not continue_on_error and len(state['errors']) > 0
+    
+    try:
+        for line in stream_lines_clean(lines):
+            data = (line + '\n').encode()
+            assert len(data) <= state['rx_size'], \
+                   'Line longer than receive buffer: %s' % line
+    
+            # Wait until the line fits behind those not yet acknowledged.
+            while not failed() and (state['paused'] or (len(state['pending']) and
+                                    state['queued'] + len(data) > window)):
+                changed.clear()
+                await changed.wait()
+                if on_status is not None:
+                    on_status(state)
+            if failed():
+                break
+    
+            state['pending'].append(len(data))
+            state['queued'] += len(data)
+            state['sent'] += 1
+            await write_all(fd, data)
+    
+        while len(state['pending']) and not failed():
+            changed.clear()
+            await changed.wait()
+            if on_status is not None:
+                on_status(state)
+    
+        if failed():
+            await stream_stop(fd, state)
+    finally:
+        if poll is not None:
+            poll.cancel()
+        loop.remove_reader(fd)
+    
+    return state
+
+
+def sim_state(rx_size=128, planner_size=15, block_time=0.002, latency=0.005):
+    '''Return a new state for a simulated GRBL.
+Each planned line takes block_time seconds to execute, and responses take
+  latency seconds to reach the sender, like a USB serial link.
+    '''
+    assert isinstance(rx_size, int) and rx_size > 0
+    assert isinstance(planner_size, int) and planner_size > 0
+    assert isinstance(block_time, float) and block_time >= 0.0
+    assert isinstance(latency, float) and latency >= 0.0
+    
+    return {
+            'rx_size': rx_size,
+            'planner_size': planner_size,
+            'block_time': block_time,
+            'latency': latency,
+            'rx': b'',
+            'planner': collections.deque(),
+            'hold': False,
+            'executed': 0,
+            'overflows': 0,
+            'starved': 0.0,
+           }
+
+
+async def grbl_sim(fd=None, sim=None):
+    '''Behave like GRBL on the controller end of a pty, until cancelled.
+GRBL replies ok once a line is moved from the receive buffer into the
+  planner, so a sender waiting for each ok still leaves gaps in the planner.
+Time the planner spends empty between blocks is added up in sim['starved'].
+    '''
+    if sim is None:
+        sim = sim_state()
+    
+    loop = asyncio.get_running_loop()
+    changed = asyncio.Event()
+    
+    def reply(data):
+        loop.call_later(sim['latency'], os.write, fd, data)
+    
+    def readable():
+        try:
+            data = os.read(fd, 4096)
+        except (BlockingIOError, OSError):
+            return
+    
+        # Realtime commands are acted on immediately, not buffered.
+        for c in re.findall(rb'[?!~]', data):
+            if c == b'?':
+                state = 'Hold' if sim['hold'] else \
+                        'Run' if len(sim['planner']) else 'Idle'
+                reply(('<%s|Bf:%d,%d>\r\n' % (state,
+                       sim['planner_size'] - len(sim['planner']),
+                       sim['rx_size'] - len(sim['rx']))).encode())
+            elif c == b'!':
+                sim['hold'] = True
+            elif c == b'~':
+                sim['hold'] = False
+        sim['rx'] += re.sub(rb'[?!~]', b'', data)
+    
+        if len(sim['rx']) > sim['rx_size']:
+            sim['overflows'] += 1
+        changed.set()
+    
+    loop.add_reader(fd, readable)
+    try:
+        while True:
+            while len(sim['planner']) < sim['planner_size'] and b'\n' in sim['rx']:
+                (line, sim['rx']) = sim['rx'].split(b'\n', 1)
+                if not re.match(rb'[$A-Za-z]', line):
+                    # Expected command letter.
+                    reply(b'error:1\r\n')
+                    continue
+                sim['planner'].append(line)
+                reply(b'ok\r\n')
+    
+            if len(sim['planner']) and not sim['hold']:
+                await asyncio.sleep(sim['block_time'])
+                sim['planner'].popleft()
+                sim['executed'] += 1
+            else:
+                t = loop.time()
+                changed.clear()
+                await changed.wait()
+                if sim['executed'] and not sim['hold']:
+                    sim['starved'] += loop.time() - t
+    finally:
+        loop.remove_reader(fd)
+
+
+async def simulate(lines=[], state=None, sim=None, status_interval=0.25,
+                   continue_on_error=False):
+    '''Stream lines to a simulated GRBL on a pty, returning (state, sim, time).
+    '''
+    (master, slave) = os.openpty()
+    tty.setraw(master)
+    tty.setraw(slave)
+    os.set_blocking(master, False)
+    os.set_blocking(slave, False)
+    
+    loop = asyncio.get_running_loop()
+    task = asyncio.ensure_future(grbl_sim(master, sim))
+    t = loop.time()
+    try:
+        state = await stream(slave, lines, state, status_interval,
+                             continue_on_error=continue_on_error)
+        t = loop.time() - t
+    finally:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        os.close(master)
+        os.close(slave)
+    
+    return (state, sim, t)
+
+
+if __name__ == '__main__':
+    import argparse
+    import signal
+    import sys
+    
+    parser = argparse.ArgumentParser()
+    
+    parser.add_argument('input',
+                        nargs='?',
+                        default='-',
+                        help='gcode file to read, or - for STDIN')
+    
+    parser.add_argument('--port',
+                        action='store',
+                        default='/dev/ttyACM0',
+                        help='serial port of controller')
+    
+    parser.add_argument('--baud',
+                        action='store',
+                        default=115200,
+                        type=int,
+                        help='serial port speed')
+    
+    parser.add_argument('--rx_size',
+                        action='store',
+                        default=128,
+                        type=int,
+                        help='size of controller receive buffer (bytes)')
+    
+    parser.add_argument('--flow',
+                        action='store',
+                        default='count',
+                        choices=['count', 'ok'],
+                        help='character counting, or wait for each ok')
+    
+    parser.add_argument('--status',
+                        action='store',
+                        default=0.25,
+                        type=float,
+                        help='status report interval, 0 to disable (seconds)')
+    
+    parser.add_argument('--simulate',
+                        action='store',
+                        default=0,
+                        type=int,
+                        choices=[0, 1],
+                        help='stream to a simulated GRBL instead of port')
+    
+    parser.add_argument('--continue_on_error',
+                        action='store',
+                        default=0,
+                        type=int,
+                        choices=[0, 1],
+                        help='keep streaming after an error or alarm')
+    
+    parser.add_argument('--block_time',
+                        action='store',
+                        default=0.002,
+                        type=float,
+                        help='simulated execution time per line (seconds)')
+    
+    parser.add_argument('--latency',
+                        action='store',
+                        default=0.005,
+                        type=float,
+                        help='simulated response latency (seconds)')
+    
+    args = parser.parse_args()
+    
+    fd = sys.stdin if args.input == '-' else open(args.input)
+    lines = list(stream_lines_clean(fd))
+    state = stream_state(args.rx_size, args.flow)
+    
+    async def main():
+        if args.simulate:
+            sim = sim_state(args.rx_size, block_time=args.block_time,
+                            latency=args.latency)
+            (_, _, t) = await simulate(lines, state, sim, args.status,
+                                       args.continue_on_error)
+            out = ['starved: %0.3fs' % sim['starved']]
+            if sim['overflows']:
+                out += ['WARNING: receive buffer overflowed %d times' % sim['overflows']]
+        else:
+            port = open_port(args.port, args.baud)
+    
+            # SIGUSR1 pauses and SIGUSR2 resumes, e.g. from another terminal.
+            loop = asyncio.get_running_loop()
+            loop.add_signal_handler(signal.SIGUSR1, lambda:
+                                    asyncio.ensure_future(stream_pause(port, state)))
+            loop.add_signal_handler(signal.SIGUSR2, lambda:
+                                    asyncio.ensure_future(stream_resume(port, state)))
+    
+            def on_status(s):
+                if len(s['status']):
+                    sys.stderr.write('\r%d/%d %s ' % (s['acked'], len(lines),
+                                                      s['status']['state']))
+    
+            t = loop.time()
+            await stream(port, lines, state, args.status, on_status,
+                          args.continue_on_error)
+            t = loop.time() - t
+            os.close(port)
+            out = ['']
+    
+        out += ['lines: %d' % state['acked']]
+        out += ['time: %0.3fs' % t]
+        out += ['rate: %0.1f lines/s' % (state['acked'] / t if t > 0.0 else 0.0)]
+        out += ['%d: %s' % e for e in state['errors']]
+        if state['stopped']:
+            out += ['stopped with feed hold, reset controller before continuing']
+        sys.stderr.write('\n'.join(out) + '\n')
+        
+        # Messages such as probe results go to STDOUT so they can be saved.
+        if len(state['messages']):
+            print('\n'.join(state['messages']))
+    
+    asyncio.run(main())
+    
+    if len(state['errors']):
+        sys.exit(1)
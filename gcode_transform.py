@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# Shift, rotate or mirror an existing gcode program, writing the result to
+#   STDOUT.
+# Only the XY plane (G17) is transformed, Z is left untouched.
+
+from gcode_parse import *
+from math_base import *
+
+# Reflections reverse the direction of arcs.
+arc_swap = {('G', '2'): ('G', '3'), ('G', '3'): ('G', '2')}
+
+
+def transform_moves(moves=[], m=(1.0, 0.0, 0.0, 1.0, 0.0, 0.0), stats=None):
+    '''Generate lines of gcode for parsed moves under an affine_2d() transform.
+Absolute positions are transformed as points, relative moves and arc centre
+  offsets as vectors, so a shift or the centre of rotation only affects a
+  program with absolute XY moves.
+If the transform is a reflection G2 and G3 are swapped, including on lines
+  which only set the motion mode.
+If stats is a dict it's updated with the number of absolute XY moves.
+    '''
+    mirror = m[0]*m[3] - m[1]*m[2] < 0.0
+    
+    if stats is None:
+        stats = {}
+    stats['absolute'] = 0
+    
+    for move in moves:
+        if mirror and move['plane'] == 'G17' and \
+           any([w in arc_swap for w in move['words']]):
+            move = dict(move)
+            move['words'] = [arc_swap.get(w, w) for w in move['words']]
+            move['raw'] = gcode_format(move)
+        
+        axes = move['axes']
+        if move['motion'] is None or move['plane'] != 'G17':
+            yield move['raw']
+            continue
+        
+        if not ('X' in axes or 'Y' in axes or 'I' in axes or 'J' in axes):
+            yield move['raw']
+            continue
+        
+        new = dict(axes)
+        if 'X' in axes or 'Y' in axes:
+            end = pt_affine(move['end'][:2], m)
+            if move['distance'] == 'G90':
+                (new['X'], new['Y']) = end
+                stats['absolute'] += 1
+            else:
+                # Difference of fixed point positions so relative moves don't
+                #   accumulate rounding error.
+                start = pt_affine(move['start'][:2], m)
+                (new['X'], new['Y']) = [float(to_fixed(end[i]) - to_fixed(start[i])) \
+                                        / FIXED_SCALE for i in range(2)]
+        if 'I' in axes or 'J' in axes:
+            (new['I'], new['J']) = vector_affine((axes.get('I', 0.0),
+                                                  axes.get('J', 0.0)), m)
+        
+        yield gcode_format(move, new)
+
+
+if __name__ == '__main__':
+    import argparse
+    import sys
+    
+    parser = argparse.ArgumentParser()
+    
+    parser.add_argument('input',
+                        nargs='?',
+                        default='-',
+                        help='gcode file to read, or - for STDIN')
+    
+    parser.add_argument('--shift',
+                        action='store',
+                        default=[0.0, 0.0],
+                        nargs=2,
+                        type=float,
+                        help='shift in X and Y (mm)')
+    
+    parser.add_argument('--rotate',
+                        action='store',
+                        default=0.0,
+                        type=float,
+                        help='rotation around center (radians)')
+    
+    parser.add_argument('--center',
+                        action='store',
+                        default=[0.0, 0.0],
+                        nargs=2,
+                        type=float,
+                        help='center of rotation and mirroring (mm)')
+    
+    parser.add_argument('--mirror',
+                        action='store',
+                        default=[0, 0],
+                        nargs=2,
+                        type=int,
+                        choices=[0, 1],
+                        help='negate X and/or Y around center, before rotating')
+
+    args = parser.parse_args()
+    
+    m = affine_2d(args.shift, args.rotate, tuple(args.center),
+                  [bool(i) for i in args.mirror])
+    
+    fd = sys.stdin if args.input == '-' else open(args.input)
+    stats = {}
+    for line in transform_moves(gcode_parse(fd), m, stats):
+        sys.stdout.write(line + '\n')
+    
+    # Relative moves are only rotated and mirrored, never shifted.
+    if stats['absolute'] == 0 and any([v != 0.0 for v in args.shift + args.center]):
+        sys.stderr.write('WARNING: no absolute XY moves, --shift and --center have no effect\n')
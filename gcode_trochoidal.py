@@ -0,0 +1,158 @@
+# Functions for trochoidal milling of slots and narrow features.
+# The tool moves in overlapping circular loops whose centres advance along a
+#   path, so only a small arc of the tool is engaged at any time.
+# A path cut with loops of radius r sweeps the same width as an endmill of
+#   diameter endmill + 2r, so point generators such as cherrymx_points can be
+#   given that effective endmill to get the loop centre path.
+
+from gcode_base import *
+from math_base import *
+
+
+def trochoid_centers(pts=[], stepover=0.0, closed=True):
+    '''Return loop centres spaced evenly along a path of absolute points.
+Each segment is split into equal steps no longer than stepover.
+Zero length segments are skipped.
+Each centre is returned with the unit direction of its segment.
+    '''
+    assert isinstance(pts, list) and len(pts) > 1
+    assert isinstance(stepover, float) and stepover > 0.0
+    assert isinstance(closed, bool)
+    l_pts = len(pts)
+    n_segs = l_pts if closed else l_pts - 1
+    
+    centers = []
+    for i in range(n_segs):
+        a = pts[i]
+        b = pts[(i+1) % l_pts]
+        l = distance_between_pts(a, b)
+        if l == 0.0:
+            continue
+        u = ((b[0] - a[0]) / l, (b[1] - a[1]) / l)
+        n_steps = int(ceil(l / stepover))
+        for j in range(n_steps):
+            centers.append((pt_between_pts(a, b, float(j) / n_steps), u))
+    
+    # Finish on the end of the path with the direction of the last segment.
+    centers.append((pts[0] if closed else pts[-1], centers[-1][1]))
+    
+    return centers
+
+
+def trochoidal_path(
+                    pts=[],
+                    radius=0.0,
+                    stepover=0.0,
+                    depth=0.0,
+                    feedrate=0.0,
+                    direction='ccw',
+                    closed=True,
+                   ):
+    '''Generate gcode for trochoidal loops along a path of absolute points.
+Assume the tool is on the first loop, at radius to the LHS of the first
+  centre, and in relative (G91) mode.
+The first loop is a helix which descends by depth.
+The tool ends on the last loop, at radius to the LHS of the last centre.
+    '''
+    assert isinstance(radius, float) and radius > 0.0
+    assert isinstance(depth, float) and depth >= 0.0
+    assert isinstance(feedrate, float) and feedrate > 0.0
+    assert isinstance(direction, str) and direction in ['cw', 'ccw']
+    
+    if direction == 'cw':
+        g_dir = 'G2'
+    else:
+        g_dir = 'G3'
+    
+    # Tool positions are fixed point before taking differences so the
+    #   relative moves always add up to the path.
+    prev = None
+    g = []
+    for k, (c, u) in enumerate(trochoid_centers(pts, stepover, closed)):
+        n = (-u[1]*radius, u[0]*radius)
+        pos = (to_fixed(c[0] + n[0]), to_fixed(c[1] + n[1]))
+        if prev is not None:
+            g.append('G1 X%(x)s Y%(y)s F%(f)s' % {
+                                                  'x': fixedf(pos[0] - prev[0]),
+                                                  'y': fixedf(pos[1] - prev[1]),
+                                                  'f': floatf(feedrate),
+                                                 })
+        g.append('%(dir)s X0 Y0 Z%(z)s I%(i)s J%(j)s F%(f)s' % {
+                                                    'dir': g_dir,
+                                                    'f': floatf(feedrate),
+                                                    'z': floatf(-depth if k == 0 else 0.0),
+                                                    'i': floatf(-n[0]),
+                                                    'j': floatf(-n[1]),
+                                                   })
+        prev = pos
+    
+    return '\n'.join(g)
+
+
+def trochoidal_profile(
+                       pts=[],
+                       radius=0.0,
+                       stepover=0.0,
+                       depth=0.0,
+                       pitch=0.0,
+                       feedrate=0.0,
+                       clearance=0.0,
+                       direction='ccw',
+                       min_pitch=0.0,
+                       finishing=0.0,
+                      ):
+    '''Generate gcode for a closed polygon cut with trochoidal loops.
+Points are the loop centres, relative to the current position.
+min_pitch and finishing set the depth passes, see depth_passes().
+Assume spindle is at clearance and in relative (G91) mode.
+Returns spindle to clearance and starting XY.
+    '''
+    assert isinstance(pts, list) and len(pts) > 1
+    assert isinstance(radius, float) and radius > 0.0
+    assert isinstance(stepover, float) and 0.0 < stepover < radius
+    assert isinstance(depth, float) and depth > 0.0
+    assert isinstance(pitch, float) and pitch > 0.0
+    assert isinstance(feedrate, float) and feedrate > 0.0
+    assert isinstance(clearance, float) and clearance > 0.0
+    
+    centers = trochoid_centers(pts, stepover)
+    (c, u) = centers[0]
+    start = (to_fixed(c[0] - u[1]*radius), to_fixed(c[1] + u[0]*radius))
+    
+    # The loops end on the first centre but with the last direction, so
+    #   close the gap before starting the next pass.
+    (c, u) = centers[-1]
+    end = (to_fixed(c[0] - u[1]*radius), to_fixed(c[1] + u[0]*radius))
+    
+    g = []
+    
+    # Assume spindle is at clearance and zeroXY.
+    # Move to start XY.
+    g.append('G0 X%(x)s Y%(y)s' % {
+                                   'x': fixedf(start[0]),
+                                   'y': fixedf(start[1]),
+                                  })
+    
+    # Move down to Z0 at start XY
+    g.append('G0 Z-%s' % floatf(clearance))
+    
+    # For each cut pass generate the relative gcode.
+    cuts = fixed_steps(depth_passes(depth, pitch, min_pitch, finishing))
+    for i, c in enumerate(cuts):
+        g.append('(cut%d)' % i)
+        g.append(trochoidal_path(pts, radius, stepover, float(c) / FIXED_SCALE,
+                                 feedrate, direction))
+        g.append('G1 X%(x)s Y%(y)s F%(f)s' % {
+                                              'x': fixedf(start[0] - end[0]),
+                                              'y': fixedf(start[1] - end[1]),
+                                              'f': floatf(feedrate),
+                                             })
+    
+    # Move back to start position
+    g.append('G0 Z%s' % fixedf(to_fixed(clearance) + sum(cuts)))
+    g.append('G0 X%(x)s Y%(y)s' % {
+                                   'x': fixedf(start[0] * -1),
+                                   'y': fixedf(start[1] * -1),
+                                  })
+    
+    return '\n'.join(g)
@@ -2,12 +2,17 @@
 # Everything is always in millimeters, not stupid imperial!
 # Jog machine to desired location then run the output generated by this script.
 
+from feeds_speeds import *
 from gcode_profile_circle import *
 
-if __name__ == '__main__':
+def helical_hole_gcode(argv=None):
+    '''Return gcode for command line arguments, from sys.argv if argv is None.
+Nothing is printed, so this can be called repeatedly by a long running
+  process such as gcode_server.py.
+    '''
     import argparse
     
-    parser = argparse.ArgumentParser()
+    parser = argparse.ArgumentParser(prog='helical_hole.py')
     
     parser.add_argument('--diameter',
                         action='store',
@@ -27,6 +32,18 @@ if __name__ == '__main__':
                         type=float,
                         help='helix pitch (mm)')
     
+    parser.add_argument('--min_pitch',
+                        action='store',
+                        default=0.0,
+                        type=float,
+                        help='shallowest pass allowed when balancing passes, 0 for no limit (mm)')
+    
+    parser.add_argument('--finishing',
+                        action='store',
+                        default=0.0,
+                        type=float,
+                        help='depth of a separate last pass, 0 for none (mm)')
+    
     parser.add_argument('--feedrate',
                         action='store',
                         default=500.0,
@@ -50,8 +67,55 @@ if __name__ == '__main__':
                         default=0.0,
                         type=float,
                         help='roughing thickness (mm)')
+    
+    parser.add_argument('--clear',
+                        action='store',
+                        default=0,
+                        type=int,
+                        choices=[0, 1],
+                        help='clear whole hole by spiralling out from centre')
+    
+    parser.add_argument('--stepover',
+                        action='store',
+                        default=1.2,
+                        type=float,
+                        help='radial stepover when clearing (mm)')
+    
+    parser.add_argument('--tool',
+                        action='store',
+                        default='',
+                        choices=[''] + sorted(tool_library.keys()),
+                        help='endmill from the tool library, overrides --endmill')
+    
+    parser.add_argument('--material',
+                        action='store',
+                        default='',
+                        choices=[''] + sorted(material_library.keys()),
+                        help='calculate feeds for this material, overrides --feedrate, --pitch and --stepover')
+    
+    parser.add_argument('--rpm',
+                        action='store',
+                        default=10000.0,
+                        type=float,
+                        help='spindle speed used to calculate feeds (rpm)')
+    
+    parser.add_argument('--adaptive',
+                        action='store',
+                        default=0,
+                        type=int,
+                        choices=[0, 1],
+                        help='set feedrate of each pass for how much of the endmill is engaged')
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    
+    # A material sets the feeds, for a tool from the library or a 2 flute
+    #   endmill of the given diameter.
+    if len(args.tool):
+        args.endmill = tool_library[args.tool]['diameter']
+    if len(args.material):
+        tool = args.tool if len(args.tool) else tool_spec(args.endmill)
+        fs = feeds_speeds(tool, args.material, args.rpm)
+        (args.feedrate, args.pitch, args.stepover) = (fs['feedrate'], fs['pitch'], fs['stepover'])
     
     # Initialise gcode lines.
     g = []
@@ -66,13 +130,36 @@ if __name__ == '__main__':
     if args.direction == 'ccw':
         offset = offset * -1
     
-    g.append(profile_circle_rel(
-                                diameter=args.diameter,
-                                depth=args.depth,
-                                pitch=args.pitch,
-                                feedrate=args.feedrate,
-                                offset=offset,
-                                direction=args.direction,
-                                roughing=args.roughing,
-                               ))
-    print('\n'.join(g))
+    if args.clear:
+        g.append(clear_circle_rel(
+                                  diameter=args.diameter,
+                                  depth=args.depth,
+                                  pitch=args.pitch,
+                                  stepover=args.stepover,
+                                  feedrate=args.feedrate,
+                                  endmill=args.endmill,
+                                  direction=args.direction,
+                                  adaptive=bool(args.adaptive),
+                                  min_pitch=args.min_pitch,
+                                  finishing=args.finishing,
+                                 ))
+    else:
+        g.append(profile_circle_rel(
+                                    diameter=args.diameter,
+                                    depth=args.depth,
+                                    pitch=args.pitch,
+                                    feedrate=args.feedrate,
+                                    offset=offset,
+                                    direction=args.direction,
+                                    roughing=args.roughing,
+                                    endmill=args.endmill,
+                                    adaptive=bool(args.adaptive),
+                                    min_pitch=args.min_pitch,
+                                    finishing=args.finishing,
+                                   ))
+    return '\n'.join(g)
+
+
+if __name__ == '__main__':
+    # Put gcode onto STDOUT to let caller do any file redirect.
+    print(helical_hole_gcode())
@@ -0,0 +1,196 @@
+# Functions for checking that features in a layout don't interfere.
+# Features are circles (drill holes, helical holes) or polygons (profiled
+#   holes) describing the area of material each one removes.
+# A uniform grid is used as the spatial index so only features which are
+#   near each other are compared, which keeps checks fast for layouts with
+#   thousands of features.
+
+from math_base import *
+
+
+def feature_circle(center=(0.0, 0.0), radius=0.0, name=''):
+    '''Return a circular feature.
+    '''
+    assert isinstance(center, tuple) and len(center) == 2
+    assert isinstance(radius, float) and radius >= 0.0
+    
+    return {
+            'name': name,
+            'center': center,
+            'radius': radius,
+            'pts': None,
+            'bbox': (center[0] - radius, center[1] - radius,
+                     center[0] + radius, center[1] + radius),
+           }
+
+
+def feature_polygon(pts=[], name=''):
+    '''Return a polygonal feature.
+    '''
+    assert isinstance(pts, list) and len(pts) > 2
+    
+    xs = [p[0] for p in pts]
+    ys = [p[1] for p in pts]
+    return {
+            'name': name,
+            'center': None,
+            'radius': None,
+            'pts': pts,
+            'bbox': (min(xs), min(ys), max(xs), max(ys)),
+           }
+
+
+def grid_index(features=[], cell=0.0):
+    '''Return a dict of grid cell to list of indices of features whose
+  bounding box touches that cell.
+    '''
+    assert isinstance(features, list)
+    assert isinstance(cell, float) and cell > 0.0
+    
+    grid = {}
+    for i, f in enumerate(features):
+        (x0, y0, x1, y1) = f['bbox']
+        for gx in range(int(floor(x0 / cell)), int(floor(x1 / cell)) + 1):
+            for gy in range(int(floor(y0 / cell)), int(floor(y1 / cell)) + 1):
+                grid.setdefault((gx, gy), []).append(i)
+    return grid
+
+
+def candidate_pairs(features=[], clearance=0.0):
+    '''Return sorted list of (i, j) index pairs of features whose bounding
+  boxes come within clearance of each other.
+    '''
+    assert isinstance(features, list)
+    assert isinstance(clearance, float) and clearance >= 0.0
+    if len(features) < 2:
+        return []
+    
+    # Cells the size of the largest feature keep the number of cells each
+    #   feature touches small.
+    cell = max([max(f['bbox'][2] - f['bbox'][0], f['bbox'][3] - f['bbox'][1]) \
+                for f in features]) + clearance
+    if cell <= 0.0:
+        cell = 1.0
+    grid = grid_index(features, cell)
+    
+    pairs = set()
+    for idxs in grid.values():
+        for a in range(len(idxs)):
+            for b in range(a+1, len(idxs)):
+                pairs.add((idxs[a], idxs[b]))
+    
+    # Neighbouring cells are not searched, so also catch pairs which only
+    #   come within clearance across a cell boundary.
+    if clearance > 0.0:
+        for (gx, gy), idxs in grid.items():
+            for (dx, dy) in [(1, 0), (0, 1), (1, 1), (1, -1)]:
+                for j in grid.get((gx + dx, gy + dy), []):
+                    for i in idxs:
+                        if i != j:
+                            pairs.add((min(i, j), max(i, j)))
+    
+    def near(a, b):
+        return a[0] - clearance <= b[2] and b[0] - clearance <= a[2] and \
+               a[1] - clearance <= b[3] and b[1] - clearance <= a[3]
+    
+    return sorted([(i, j) for (i, j) in pairs \
+                   if near(features[i]['bbox'], features[j]['bbox'])])
+
+
+def edges(pts=[]):
+    '''Return list of (a, b) edges of a closed polygon.
+    '''
+    l_pts = len(pts)
+    return [(pts[i], pts[(i+1) % l_pts]) for i in range(l_pts)]
+
+
+def feature_distance(a={}, b={}):
+    '''Return the gap between two features, and a point where it is smallest.
+Gap is 0.0 or negative where the features overlap.
+    '''
+    if a['pts'] is None and b['pts'] is None:
+        d = distance_between_pts(a['center'], b['center'])
+        gap = d - a['radius'] - b['radius']
+        t = 0.5 if d == 0.0 else min(1.0, max(0.0, (a['radius'] + gap/2) / d))
+        return (gap, pt_between_pts(a['center'], b['center'], t))
+    
+    if a['pts'] is None:
+        (a, b) = (b, a)
+    
+    if b['pts'] is None:
+        # Polygon and circle.
+        c = b['center']
+        if pt_in_polygon(c, a['pts']):
+            return (-b['radius'], c)
+        d = min([distance_pt_segment(c, e[0], e[1]) for e in edges(a['pts'])])
+        return (d - b['radius'], c)
+    
+    # Polygon and polygon.
+    for (p, q) in [(a, b), (b, a)]:
+        for pt in p['pts']:
+            if pt_in_polygon(pt, q['pts']):
+                return (0.0, pt)
+    if polygons_intersect(a['pts'], b['pts']):
+        return (0.0, a['pts'][0])
+    
+    best = None
+    for (p, q) in [(a, b), (b, a)]:
+        for pt in p['pts']:
+            for e in edges(q['pts']):
+                d = distance_pt_segment(pt, e[0], e[1])
+                if best is None or d < best[0]:
+                    best = (d, pt)
+    return best
+
+
+def boundary_gap(f={}, center=(0.0, 0.0), radius=0.0):
+    '''Return the gap between a feature and the inside of a circular boundary,
+  and the point of the feature closest to the boundary.
+    '''
+    if f['pts'] is None:
+        d = distance_between_pts(f['center'], center)
+        if d == 0.0:
+            return (radius - f['radius'], f['center'])
+        t = (d + f['radius']) / d
+        return (radius - d - f['radius'],
+                (center[0] + (f['center'][0] - center[0])*t,
+                 center[1] + (f['center'][1] - center[1])*t))
+    
+    (d, pt) = max([(distance_between_pts(p, center), p) for p in f['pts']])
+    return (radius - d, pt)
+
+
+def check_layout(features=[], clearance=0.0, boundary=None):
+    '''Return a list of violations where features come closer than clearance
+  to each other, or to the inside of boundary.
+Boundary is None or a (center, radius) tuple.
+Each violation is a dict with the names of the features ('a' and 'b', where
+  'b' is None for the boundary), the gap, and a location near the problem.
+    '''
+    assert isinstance(features, list)
+    assert isinstance(clearance, float) and clearance >= 0.0
+    
+    r = []
+    for (i, j) in candidate_pairs(features, clearance):
+        (gap, pt) = feature_distance(features[i], features[j])
+        if gap < clearance:
+            r.append({
+                      'a': features[i]['name'],
+                      'b': features[j]['name'],
+                      'gap': gap,
+                      'location': pt,
+                     })
+    
+    if boundary is not None:
+        (center, radius) = boundary
+        for f in features:
+            (gap, pt) = boundary_gap(f, center, radius)
+            if gap < clearance:
+                r.append({
+                          'a': f['name'],
+                          'b': None,
+                          'gap': gap,
+                          'location': pt,
+                         })
+    
+    return r
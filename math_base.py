@@ -259,13 +259,31 @@ There must be the same number of planes as dimensions, but the value of each
     return [pt_reflect(pt, plane) for pt in pts]
 
 
-def gen_polygon_pts(n_pts=3, radius=[1.0]):
+# Cache of unit circle tables, keyed by number of points.
+unit_circle_tables = {}
+
+
+def unit_circle_pts(n_pts=3):
+    '''Return the n-th roots of unity as a list of (cos, sin) tuples.
+Tables are cached, so repeatedly generating shapes with the same number of
+  points costs no trigonometry after the first time.
+    '''
+    assert isinstance(n_pts, int) and n_pts > 0
+    
+    if n_pts not in unit_circle_tables:
+        unit_circle_tables[n_pts] = [(cos(i*2*pi/n_pts), sin(i*2*pi/n_pts)) \
+                                     for i in range(n_pts)]
+    return unit_circle_tables[n_pts]
+
+
+def gen_polygon_pts(n_pts=3, radius=[1.0], phase=0.0):
     '''Generate points for a polygon with a number of radiuses.
 This makes it easy to generate shapes with an arbitrary number of sides,
   regularly angled around the origin.
 A single radius will give a simple shape such as a square, hexagon, etc.
 Multiple radiuses will give complex shapes like stars, gear wheels, ratchet
   wheels, etc.
+Phase is the angle of the first point in radians.
     '''
     assert isinstance(n_pts, int) and n_pts > 0
     assert isinstance(radius, list)
@@ -273,7 +291,281 @@ Multiple radiuses will give complex shapes like stars, gear wheels, ratchet
     assert l_rad > 0
     for i in radius:
         assert isinstance(i, float)
-
-    return [pt_rotate((radius[i % l_rad], 0.0), [i*2*pi/n_pts]) \
+    assert isinstance(phase, float)
+    
+    table = unit_circle_pts(n_pts)
+    if phase != 0.0:
+        (pc, ps) = (cos(phase), sin(phase))
+        table = [(c*pc - s*ps, s*pc + c*ps) for (c, s) in table]
+    
+    return [(radius[i % l_rad] * table[i][0], radius[i % l_rad] * table[i][1]) \
             for i in range(n_pts)]
 
+
+def gen_polygons_pts(n_pts=3, radii=[[1.0]], phase=0.0):
+    '''Generate points for many polygons with the same number of points, such
+  as a set of gear wheels, sharing one unit circle table.
+Radii is a list with a list of radiuses for each polygon.
+    '''
+    assert isinstance(radii, list)
+    
+    return [gen_polygon_pts(n_pts, radius, phase) for radius in radii]
+
+
+def vectors_along_pts(pts=[]):
+    '''Return vectors between consecutive points on N dimensions.
+Unlike vectors_between_pts the path is left open, so there is one less vector
+  than there are points.
+    '''
+    assert isinstance(pts, list) and len(pts) > 0
+    l_pt = len(pts[0])
+    for pt in pts:
+        assert isinstance(pt, tuple)
+        assert len(pt) == l_pt
+    
+    return [tuple([pts[i+1][j] - pts[i][j] for j in range(l_pt)]) \
+            for i in range(len(pts)-1)]
+
+
+def polygon_area(pts=[]):
+    '''Return signed area of a 2D polygon using the shoelace formula.
+Positive for CCW ordered points, negative for CW ordered points.
+    '''
+    assert isinstance(pts, list) and len(pts) > 2
+    l_pts = len(pts)
+    
+    return sum([pts[i][0]*pts[(i+1) % l_pts][1] - pts[(i+1) % l_pts][0]*pts[i][1] \
+                for i in range(l_pts)]) / 2
+
+
+def pt_in_polygon(pt=(0.0, 0.0), pts=[]):
+    '''Return True if a 2D point is inside a polygon, using the even-odd rule.
+    '''
+    assert isinstance(pt, tuple) and len(pt) == 2
+    assert isinstance(pts, list) and len(pts) > 2
+    
+    x, y = pt
+    inside = False
+    j = pts[-1]
+    for i in pts:
+        if (i[1] > y) != (j[1] > y):
+            # X coordinate where this edge crosses the horizontal through pt.
+            xc = i[0] + (y - i[1]) * (j[0] - i[0]) / (j[1] - i[1])
+            if x < xc:
+                inside = not inside
+        j = i
+    
+    return inside
+
+
+def segments_intersect(a=(0.0, 0.0), b=(0.0, 0.0), c=(0.0, 0.0), d=(0.0, 0.0)):
+    '''Return True if 2D line segment ab properly crosses line segment cd.
+Touching at endpoints and collinear overlaps are not counted.
+    '''
+    def cross(o, p, q):
+        return (p[0] - o[0]) * (q[1] - o[1]) - (p[1] - o[1]) * (q[0] - o[0])
+    
+    d1 = cross(c, d, a)
+    d2 = cross(c, d, b)
+    d3 = cross(a, b, c)
+    d4 = cross(a, b, d)
+    
+    return ((d1 > 0) != (d2 > 0)) and ((d3 > 0) != (d4 > 0)) and \
+           d1 != 0 and d2 != 0 and d3 != 0 and d4 != 0
+
+
+def polygons_intersect(a=[], b=[]):
+    '''Return True if any edge of 2D polygon a crosses any edge of polygon b.
+    '''
+    assert isinstance(a, list) and len(a) > 1
+    assert isinstance(b, list) and len(b) > 1
+    l_a = len(a)
+    l_b = len(b)
+    
+    for i in range(l_a):
+        for j in range(l_b):
+            if segments_intersect(a[i], a[(i+1) % l_a], b[j], b[(j+1) % l_b]):
+                return True
+    return False
+
+
+def polygon_offset(pts=[], distance=0.0):
+    '''Return a 2D polygon with every edge moved by a distance.
++ve distance moves edges to the LHS of the direction of travel, which is
+  inwards for a CCW polygon and outwards for a CW polygon.
+Adjacent offset edges are joined at their intersection (mitre join).
+None is returned if any edge collapses, i.e. reverses direction, which means
+  the offset is too large for this simple method to give a valid polygon.
+    '''
+    assert isinstance(pts, list) and len(pts) > 2
+    assert isinstance(distance, float)
+    l_pts = len(pts)
+    
+    # Offset each edge along its LHS unit normal.
+    lines = []
+    for i in range(l_pts):
+        a = pts[i]
+        b = pts[(i+1) % l_pts]
+        l = distance_between_pts(a, b)
+        assert l > 0.0
+        n = (-(b[1] - a[1]) / l, (b[0] - a[0]) / l)
+        lines.append(((a[0] + n[0]*distance, a[1] + n[1]*distance),
+                      (b[0] - a[0], b[1] - a[1])))
+    
+    # Each new vertex is where the previous edge meets the next edge.
+    r = []
+    for i in range(l_pts):
+        (p, u) = lines[i-1]
+        (q, v) = lines[i]
+        den = u[0]*v[1] - u[1]*v[0]
+        if abs(den) < 1e-12:
+            # Parallel edges, so the vertex is just the offset start point.
+            r.append(q)
+            continue
+        t = ((q[0] - p[0])*v[1] - (q[1] - p[1])*v[0]) / den
+        r.append((p[0] + u[0]*t, p[1] + u[1]*t))
+    
+    # Reject polygons where any edge has flipped direction.
+    for i in range(l_pts):
+        a = r[i]
+        b = r[(i+1) % l_pts]
+        u = lines[i][1]
+        if (b[0] - a[0])*u[0] + (b[1] - a[1])*u[1] <= 0.0:
+            return None
+    
+    return r
+
+
+def distance_pt_segment(pt=(0.0, 0.0), a=(0.0, 0.0), b=(0.0, 0.0)):
+    '''Return the shortest distance from a 2D point to line segment ab.
+    '''
+    v = (b[0] - a[0], b[1] - a[1])
+    w = (pt[0] - a[0], pt[1] - a[1])
+    vv = v[0]**2 + v[1]**2
+    t = 0.0 if vv == 0.0 else max(0.0, min(1.0, (w[0]*v[0] + w[1]*v[1]) / vv))
+    
+    return sqrt((w[0] - t*v[0])**2 + (w[1] - t*v[1])**2)
+
+
+def affine_2d(shift=[0.0, 0.0], angle=0.0, center=(0.0, 0.0), reflect=[False, False]):
+    '''Return a 2D affine transform as a tuple (a, b, c, d, e, f), such that
+  x' = a*x + b*y + e and y' = c*x + d*y + f.
+Points are first reflected across the axes through center, then rotated by
+  angle radians around center, then shifted.
+    '''
+    assert isinstance(shift, list) and len(shift) == 2
+    assert isinstance(angle, float)
+    assert isinstance(center, tuple) and len(center) == 2
+    assert isinstance(reflect, list) and len(reflect) == 2
+    
+    sx = -1.0 if reflect[0] else 1.0
+    sy = -1.0 if reflect[1] else 1.0
+    (c, s) = (cos(angle), sin(angle))
+    (a, b, cc, d) = (c*sx, -s*sy, s*sx, c*sy)
+    
+    # Translate so center is the origin, transform, then translate back.
+    e = center[0] - a*center[0] - b*center[1] + shift[0]
+    f = center[1] - cc*center[0] - d*center[1] + shift[1]
+    
+    return (a, b, cc, d, e, f)
+
+
+def pt_affine(pt=(0.0, 0.0), m=(1.0, 0.0, 0.0, 1.0, 0.0, 0.0)):
+    '''Return given 2D point transformed by an affine_2d() transform.
+    '''
+    return (m[0]*pt[0] + m[1]*pt[1] + m[4], m[2]*pt[0] + m[3]*pt[1] + m[5])
+
+
+def vector_affine(v=(0.0, 0.0), m=(1.0, 0.0, 0.0, 1.0, 0.0, 0.0)):
+    '''Return given 2D vector transformed by an affine_2d() transform.
+Vectors are only rotated and reflected, never shifted.
+    '''
+    return (m[0]*v[0] + m[1]*v[1], m[2]*v[0] + m[3]*v[1])
+
+
+def convex_hull(pts=[]):
+    '''Return the convex hull of 2D points in CCW order, using Andrew's
+  monotone chain algorithm.
+Collinear points on the hull are dropped.
+    '''
+    assert isinstance(pts, list) and len(pts) > 0
+    
+    p = sorted(set(pts))
+    if len(p) < 3:
+        return p
+    
+    def cross(o, a, b):
+        return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+    
+    lower = []
+    for pt in p:
+        while len(lower) > 1 and cross(lower[-2], lower[-1], pt) <= 0.0:
+            lower.pop()
+        lower.append(pt)
+    
+    upper = []
+    for pt in reversed(p):
+        while len(upper) > 1 and cross(upper[-2], upper[-1], pt) <= 0.0:
+            upper.pop()
+        upper.append(pt)
+    
+    # Last point of each chain is the first point of the other.
+    return lower[:-1] + upper[:-1]
+
+
+def circle_from_pts(pts=[]):
+    '''Return the smallest (center, radius) circle through 1, 2 or 3 2D points.
+Collinear triples give the circle across the two furthest apart points.
+    '''
+    assert isinstance(pts, list) and 0 < len(pts) < 4
+    
+    if len(pts) == 1:
+        return (pts[0], 0.0)
+    if len(pts) == 2:
+        return (pt_between_pts(pts[0], pts[1]), distance_between_pts(pts[0], pts[1]) / 2)
+    
+    (a, b, c) = pts
+    d = 2 * (a[0]*(b[1] - c[1]) + b[0]*(c[1] - a[1]) + c[0]*(a[1] - b[1]))
+    if d == 0.0:
+        pairs = [(a, b), (b, c), (a, c)]
+        (l, p, q) = max([(distance_between_pts(p, q), p, q) for (p, q) in pairs])
+        return circle_from_pts([p, q])
+    
+    aa = a[0]**2 + a[1]**2
+    bb = b[0]**2 + b[1]**2
+    cc = c[0]**2 + c[1]**2
+    center = ((aa*(b[1] - c[1]) + bb*(c[1] - a[1]) + cc*(a[1] - b[1])) / d,
+              (aa*(c[0] - b[0]) + bb*(a[0] - c[0]) + cc*(b[0] - a[0])) / d)
+    return (center, distance_between_pts(center, a))
+
+
+def min_enclosing_circle(pts=[]):
+    '''Return (center, radius) of the smallest circle containing 2D points.
+Welzl's algorithm in its iterative form, which takes expected linear time
+  once the points are shuffled.
+Only hull points can touch the circle, so they are all that is searched.
+    '''
+    assert isinstance(pts, list) and len(pts) > 0
+    import random
+    
+    p = convex_hull(pts)
+    
+    # Fixed seed so the same points always give exactly the same circle.
+    random.Random(len(p)).shuffle(p)
+    
+    eps = 1e-9
+    (c, r) = (p[0], 0.0)
+    for i in range(1, len(p)):
+        if distance_between_pts(p[i], c) <= r + eps:
+            continue
+        (c, r) = (p[i], 0.0)
+        for j in range(i):
+            if distance_between_pts(p[j], c) <= r + eps:
+                continue
+            (c, r) = circle_from_pts([p[i], p[j]])
+            for k in range(j):
+                if distance_between_pts(p[k], c) <= r + eps:
+                    continue
+                (c, r) = circle_from_pts([p[i], p[j], p[k]])
+    
+    return (c, r)
@@ -0,0 +1,145 @@
+# Functions for packing parts onto a sheet of stock.
+# Parts are placed one at a time, largest first, at the lowest then leftmost
+#   position where they fit (bottom-left-fill), trying each allowed rotation.
+# Collisions are tested on the convex hull of each part, first by bounding
+#   box and then with the separating axis theorem.
+# Hulls make the test conservative for concave parts, which may be packed
+#   less tightly than possible but will never overlap.
+
+from math_base import *
+
+
+def bbox_of_pts(pts=[]):
+    '''Return (x0, y0, x1, y1) bounding box of 2D points.
+    '''
+    assert isinstance(pts, list) and len(pts) > 0
+    xs = [p[0] for p in pts]
+    ys = [p[1] for p in pts]
+    return (min(xs), min(ys), max(xs), max(ys))
+
+
+def placed_pts(pts=[], placement=(0.0, 0.0, 0.0)):
+    '''Return part outline points moved to where nest_parts() placed them,
+  rotated about the part origin then shifted.
+    '''
+    assert isinstance(placement, tuple) and len(placement) == 3
+    (x, y, r) = placement
+    m = affine_2d([x, y], float(r))
+    return [pt_affine(p, m) for p in pts]
+
+
+def convex_separated(a=[], b=[], spacing=0.0):
+    '''Return True if two convex polygons are at least spacing apart along one
+  of their edge normals, using the separating axis theorem.
+Being separated along any axis by spacing means the polygons are at least
+  spacing apart.
+    '''
+    for poly in [a, b]:
+        l_poly = len(poly)
+        for i in range(l_poly):
+            p = poly[i]
+            q = poly[(i+1) % l_poly]
+            axis = (p[1] - q[1], q[0] - p[0])
+            l = sqrt(axis[0]**2 + axis[1]**2)
+            if l == 0.0:
+                continue
+            pa = [(v[0]*axis[0] + v[1]*axis[1]) / l for v in a]
+            pb = [(v[0]*axis[0] + v[1]*axis[1]) / l for v in b]
+            if min(pb) - max(pa) >= spacing or min(pa) - max(pb) >= spacing:
+                return True
+    return False
+
+
+def nest_parts(
+               parts=[],
+               sheet=(297.0, 210.0),
+               spacing=3.0,
+               margin=5.0,
+               rotations=[0.0, pi/2, pi, 3*pi/2],
+              ):
+    '''Pack part outlines onto a sheet using bottom-left-fill.
+Parts are lists of 2D points relative to the part origin, and the sheet is
+  (width, height) with its origin at the bottom left corner.
+Spacing is the smallest gap between parts, such as an endmill diameter, and
+  margin the smallest gap to the sheet edge.
+Returns one placement per part, in the same order as parts, as an
+  (x, y, rotate) tuple for the part origin just like mcdox.py mx_holes, or
+  None if the part didn't fit.
+    '''
+    assert isinstance(parts, list)
+    assert isinstance(sheet, tuple) and len(sheet) == 2
+    assert isinstance(spacing, float) and spacing >= 0.0
+    assert isinstance(margin, float) and margin >= 0.0
+    assert isinstance(rotations, list) and len(rotations) > 0
+    
+    # Hull of every part in every rotation, with its bounding box.
+    shapes = []
+    for pts in parts:
+        hull = convex_hull(pts)
+        shapes.append([(r, h, bbox_of_pts(h)) \
+                       for r in rotations \
+                       for h in [placed_pts(hull, (0.0, 0.0, r))]])
+    
+    # Largest parts first, as small ones fill the gaps left between them.
+    order = sorted(range(len(parts)),
+                   key=lambda i: -abs(polygon_area(shapes[i][0][1])) \
+                                 if len(shapes[i][0][1]) > 2 else 0.0)
+    
+    placed = [] # (hull, bbox) on the sheet.
+    placements = [None for p in parts]
+    corners = set([(margin, margin)])
+    for i in order:
+        best = None
+        for (r, hull, (x0, y0, x1, y1)) in shapes[i]:
+            for c in sorted(corners, key=lambda c: (c[1], c[0])):
+                if best is not None and (c[1], c[0]) >= best[0]:
+                    break
+                
+                # Put the bottom left of the bounding box on the corner.
+                s = (c[0] - x0, c[1] - y0)
+                bb = (c[0], c[1], x1 + s[0], y1 + s[1])
+                if bb[2] > sheet[0] - margin or bb[3] > sheet[1] - margin:
+                    continue
+                
+                moved = None
+                fits = True
+                for (ph, pb) in placed:
+                    if bb[0] >= pb[2] + spacing or pb[0] >= bb[2] + spacing or \
+                       bb[1] >= pb[3] + spacing or pb[1] >= bb[3] + spacing:
+                        continue
+                    if moved is None:
+                        moved = pts_shift(hull, [s[0], s[1]])
+                    if not convex_separated(moved, ph, spacing):
+                        fits = False
+                        break
+                if fits:
+                    best = ((c[1], c[0]), r, s, bb)
+                    break
+        
+        if best is None:
+            continue
+        
+        (key, r, s, bb) = best
+        hull = [h for (hr, h, hb) in shapes[i] if hr == r][0]
+        placed.append((pts_shift(hull, [s[0], s[1]]), bb))
+        placements[i] = (s[0], s[1], r)
+        
+        # Check the outline itself ended up within the margin.
+        (px0, py0, px1, py1) = bbox_of_pts(placed_pts(parts[i], placements[i]))
+        assert px0 >= margin - 1e-9 and py0 >= margin - 1e-9 and \
+               px1 <= sheet[0] - margin + 1e-9 and py1 <= sheet[1] - margin + 1e-9, \
+            'Part %d placed outside the sheet margin.' % i
+        
+        # New corners to the right of and above the part just placed, and
+        #   drop any corners now covered by it.
+        corners = set([c for c in corners \
+                       if not (bb[0] - spacing < c[0] < bb[2] + spacing and \
+                               bb[1] - spacing < c[1] < bb[3] + spacing)])
+        corners |= set([
+                        (bb[2] + spacing, bb[1]),
+                        (bb[0], bb[3] + spacing),
+                        (bb[2] + spacing, margin),
+                        (margin, bb[3] + spacing),
+                       ])
+    
+    return placements
@@ -0,0 +1,176 @@
+# Functions for describing arrays of features.
+# A pattern is a small dict describing where instances of a feature go, and
+#   is only expanded into positions when iterated over, so patterns of
+#   millions of instances cost no more memory than patterns of a few.
+# Instances are (x, y, rotate) tuples, the same as mcdox.py mx_holes.
+# Patterns can be nested, placing a whole pattern at every instance of
+#   another.
+
+import functools
+
+from gcode_base import *
+from math_base import *
+
+
+def pattern_linear(start=(0.0, 0.0), step=(1.0, 0.0), count=1, rotate=0.0):
+    '''Return a pattern of count instances in a line.
+    '''
+    assert isinstance(start, tuple) and len(start) == 2
+    assert isinstance(step, tuple) and len(step) == 2
+    assert isinstance(count, int) and count >= 0
+    assert isinstance(rotate, float)
+    
+    return {'kind': 'linear', 'start': start, 'step': step, 'count': count,
+            'rotate': rotate}
+
+
+def pattern_polar(
+                  center=(0.0, 0.0),
+                  radius=1.0,
+                  count=1,
+                  phase=0.0,
+                  sweep=2*pi,
+                  rotate=True,
+                 ):
+    '''Return a pattern of count instances around a circle.
+Instances start at angle phase and are spread evenly over sweep radians,
+  a full circle by default.
+If rotate is True each instance is rotated to face out from the center.
+    '''
+    assert isinstance(center, tuple) and len(center) == 2
+    assert isinstance(radius, float)
+    assert isinstance(count, int) and count >= 0
+    assert isinstance(phase, float)
+    assert isinstance(sweep, float)
+    assert isinstance(rotate, bool)
+    
+    return {'kind': 'polar', 'center': center, 'radius': radius,
+            'count': count, 'phase': phase, 'sweep': sweep, 'rotate': rotate}
+
+
+def pattern_grid(
+                 origin=(0.0, 0.0),
+                 step=(1.0, 1.0),
+                 cols=1,
+                 rows=1,
+                 serpentine=False,
+                 stagger=0.0,
+                ):
+    '''Return a pattern of instances on a rectangular grid, row by row.
+If serpentine is True every other row runs backwards, which keeps travel
+  between instances short.
+Stagger shifts every other row in X, e.g. step[0]/2 for a hexagonal array.
+    '''
+    assert isinstance(origin, tuple) and len(origin) == 2
+    assert isinstance(step, tuple) and len(step) == 2
+    assert isinstance(cols, int) and cols >= 0
+    assert isinstance(rows, int) and rows >= 0
+    assert isinstance(serpentine, bool)
+    assert isinstance(stagger, float)
+    
+    return {'kind': 'grid', 'origin': origin, 'step': step, 'cols': cols,
+            'rows': rows, 'serpentine': serpentine, 'stagger': stagger}
+
+
+def pattern_list(instances=[]):
+    '''Return a pattern of explicitly listed (x, y, rotate) instances.
+    '''
+    assert isinstance(instances, list)
+    for i in instances:
+        assert isinstance(i, tuple) and len(i) == 3
+    
+    return {'kind': 'list', 'instances': instances}
+
+
+def pattern_nested(outer={}, inner={}):
+    '''Return a pattern which places the whole of inner at every instance of
+  outer, rotating inner with each outer instance.
+    '''
+    assert isinstance(outer, dict)
+    assert isinstance(inner, dict)
+    
+    return {'kind': 'nested', 'outer': outer, 'inner': inner}
+
+
+def pattern_count(p={}):
+    '''Return the number of instances in a pattern without expanding it.
+    '''
+    kind = p['kind']
+    if kind in ['linear', 'polar']:
+        return p['count']
+    elif kind == 'grid':
+        return p['cols'] * p['rows']
+    elif kind == 'list':
+        return len(p['instances'])
+    elif kind == 'nested':
+        return pattern_count(p['outer']) * pattern_count(p['inner'])
+    assert False, 'Unknown pattern kind %s' % kind
+
+
+def expand_pattern(p={}):
+    '''Generate the (x, y, rotate) instances of a pattern in order.
+    '''
+    kind = p['kind']
+    if kind == 'linear':
+        (x, y) = p['start']
+        (dx, dy) = p['step']
+        for i in range(p['count']):
+            yield (x + i*dx, y + i*dy, p['rotate'])
+    
+    elif kind == 'polar':
+        (cx, cy) = p['center']
+        # Full circles don't repeat the first instance at the end.
+        full = abs(p['sweep']) >= 2*pi
+        div = p['count'] if full else max(1, p['count'] - 1)
+        for i in range(p['count']):
+            a = p['phase'] + i * p['sweep'] / div
+            yield (cx + p['radius']*cos(a), cy + p['radius']*sin(a),
+                   a if p['rotate'] else 0.0)
+    
+    elif kind == 'grid':
+        (x0, y0) = p['origin']
+        (dx, dy) = p['step']
+        for row in range(p['rows']):
+            cols = range(p['cols'])
+            if p['serpentine'] and row % 2:
+                cols = reversed(cols)
+            sx = p['stagger'] if row % 2 else 0.0
+            for col in cols:
+                yield (x0 + col*dx + sx, y0 + row*dy, 0.0)
+    
+    elif kind == 'list':
+        for i in p['instances']:
+            yield i
+    
+    elif kind == 'nested':
+        inner = p['inner']
+        for (ox, oy, orot) in expand_pattern(p['outer']):
+            (c, s) = (cos(orot), sin(orot))
+            for (x, y, r) in expand_pattern(inner):
+                yield (ox + x*c - y*s, oy + x*s + y*c, orot + r)
+    
+    else:
+        assert False, 'Unknown pattern kind %s' % kind
+
+
+def pattern_gcode(p={}, program=None, clearance=5.0):
+    '''Generate gcode for a relative program at every instance of a pattern.
+Program is a function taking a rotation and returning gcode which starts
+  and ends at the current position, such as a wrapper round
+  cherrymx_profile().
+Programs for recent rotations are kept rather than generated again, and
+  lines are generated lazily so the whole output never has to be held in
+  memory, even for patterns where every instance has its own rotation.
+After each instance the spindle is raised to clearance before moving on.
+Assume spindle is at clearance and in absolute (G90) mode.
+    '''
+    assert isinstance(p, dict)
+    assert program is not None
+    assert isinstance(clearance, float)
+    
+    cached = functools.lru_cache(maxsize=64)(program)
+    for (x, y, r) in expand_pattern(p):
+        yield 'G0 X%s Y%s' % (floatf(x), floatf(y))
+        yield cached(r)
+        yield 'G90'
+        yield 'G0 Z%s' % floatf(clearance)
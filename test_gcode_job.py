@@ -0,0 +1,20 @@
+from gcode_job import *
+from gcode_parse import *
+
+
+def test_pause_raises_before_travel():
+    ops = [
+           job_op(1, (10.0, 10.0), 'G91\nG1 Z-1 F100\nG1 Z1', 0.0),
+           job_op(2, (20.0, 0.0), 'G91\nG1 Z-1 F100\nG1 Z1', 0.0),
+          ]
+    g = job_gcode(ops, clearance=5.0, change_z=30.0, pause=True)
+    
+    # After each pause for a tool change Z must move before X or Y does.
+    paused = False
+    for m in gcode_parse(g.split('\n')):
+        if ('M', '0') in m['words']:
+            paused = True
+        elif paused and m['motion'] is not None:
+            assert 'Z' in m['axes'] and 'X' not in m['axes'] and 'Y' not in m['axes']
+            paused = False
+    assert not paused
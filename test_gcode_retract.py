@@ -0,0 +1,21 @@
+from gcode_job import *
+from gcode_normalize import *
+from gcode_retract import *
+
+
+def test_tool_change_keeps_height():
+    ops = [
+           job_op(1, (10.0, 0.0), 'G91\nG1 Z-1 F100\nG1 Z1', 0.0),
+           job_op(2, (20.0, 0.0), 'G91\nG1 Z-1 F100\nG1 Z1', 0.0),
+          ]
+    g = job_gcode(ops, clearance=5.0, change_z=30.0, rpm={1: 10000.0, 2: 10000.0},
+                  pause=True)
+    lines = list(normalize_moves(gcode_parse(g.split('\n')), 'G90'))
+    out = list(plan_retracts(gcode_parse(lines), 0.0, 1.0))
+    
+    # Tool changes, spindle stops and pauses happen at the same height.
+    def heights(moves):
+        return [(m['raw'], m['start'][2]) for m in moves if any([w[0] in 'MT' for w in m['words']])]
+    assert heights(gcode_parse(out)) == heights(gcode_parse(lines))
+    assert 'G0 Z30' in out
+